@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+  FritzboxStub - a local stand-in for the FRITZ!Box used by the benchmarks
+
+  The stub implements the login_sid.lua login with PBKDF2 or legacy MD5 challenges,
+  expires idle sessions and answers requests with an unknown or expired SID with
+  403 like the box does. Pages are served from fixtures/<path>[_<page>], e.g.
+  fixtures/data.lua_ecoStat for data.lua?page=ecoStat. A minimal TR-064 SOAP
+  interface with digest authentication is generated from fixtures/tr064.json.
+
+  The stub counts TCP connections (and thus TLS handshakes when started with a
+  certificate), HTTP requests, bytes transferred in both directions and logins,
+  so that benchmarks can compare the network cost of a plugin run.
+"""
+
+import os
+import ssl
+import json
+import time
+import hashlib
+import threading
+import subprocess
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__)) + '/fixtures'
+SALT1 = '5a1d0d6f8c1e4b3a'
+SALT2 = '9c2e7b1f3d4a6e8b'
+ITER1 = 1000
+ITER2 = 100
+NO_SESSION = '0000000000000000'
+DIGEST_REALM = 'F!Box SOAP-Auth'
+
+class FritzboxStubStats:
+  """counters shared by all request handlers of one stub server"""
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.connections = 0
+    self.requests = 0
+    self.bytes = 0
+    self.logins = 0
+
+  def count(self, counter: str, amount: int = 1):
+    with self.lock:
+      setattr(self, counter, getattr(self, counter) + amount)
+
+  def snapshot(self) -> dict:
+    with self.lock:
+      return {'connections': self.connections, 'requests': self.requests, 'bytes': self.bytes, 'logins': self.logins}
+
+class CountingStream:
+  """wraps the socket files of a handler to count the bytes transferred"""
+
+  def __init__(self, stream, stats: FritzboxStubStats):
+    self.__stream = stream
+    self.__stats = stats
+
+  def read(self, *args):
+    data = self.__stream.read(*args)
+    self.__stats.count('bytes', len(data))
+    return data
+
+  def readline(self, *args):
+    data = self.__stream.readline(*args)
+    self.__stats.count('bytes', len(data))
+    return data
+
+  def write(self, data):
+    self.__stats.count('bytes', len(data))
+    return self.__stream.write(data)
+
+  def __getattr__(self, name):
+    return getattr(self.__stream, name)
+
+class FritzboxStubHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  # headers and body are written separately, without TCP_NODELAY the body waits for the delayed ACK
+  disable_nagle_algorithm = True
+
+  def setup(self):
+    if self.server.context is not None:
+      # handshake in the thread of the connection, so a slow client doesn't block the accept loop
+      self.request = self.server.context.wrap_socket(self.request, server_side=True)
+    super().setup()
+    # one handler instance serves exactly one (keep-alive) connection
+    self.server.stats.count('connections')
+    self.rfile = CountingStream(self.rfile, self.server.stats)
+    self.wfile = CountingStream(self.wfile, self.server.stats)
+
+  def log_message(self, format, *args):
+    pass
+
+  def __body(self) -> bytes:
+    return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+  def __params(self) -> dict:
+    url = urlparse(self.path)
+    params = parse_qs(url.query, keep_blank_values=True)
+    if self.command == 'POST':
+      params.update(parse_qs(self.__body().decode(), keep_blank_values=True))
+    return {k: v[0] for k, v in params.items()}
+
+  def __reply(self, code: int, body: bytes, contentType: str, headers: dict = {}):
+    self.send_response(code)
+    self.send_header('Content-Type', contentType)
+    self.send_header('Content-Length', str(len(body)))
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(body)
+
+  # login_sid.lua
+
+  def __challenge(self, version: str) -> str:
+    if version == '2' and not self.server.md5:
+      return '2${}${}${}${}'.format(ITER1, SALT1, ITER2, SALT2)
+    return self.server.md5Challenge
+
+  def __sessionInfo(self, sid: str, version: str) -> bytes:
+    return ('<?xml version="1.0" encoding="utf-8"?><SessionInfo><SID>{}</SID><Challenge>{}</Challenge>'
+            '<BlockTime>0</BlockTime><Rights></Rights></SessionInfo>').format(sid, self.__challenge(version)).encode()
+
+  def __expectedResponse(self, version: str) -> str:
+    challenge = self.__challenge(version)
+    if challenge.startswith('2$'):
+      hash1 = hashlib.pbkdf2_hmac('sha256', self.server.password.encode(), bytes.fromhex(SALT1), ITER1)
+      hash2 = hashlib.pbkdf2_hmac('sha256', hash1, bytes.fromhex(SALT2), ITER2)
+      return SALT2 + '$' + hash2.hex()
+    md5 = hashlib.md5((challenge + '-' + self.server.password).encode('utf_16_le'))
+    return challenge + '-' + md5.hexdigest()
+
+  def __loginSid(self, params: dict):
+    # the response of the login doesn't repeat version=2, the stub accepts both kinds of responses then
+    sid = NO_SESSION
+    if 'response' in params:
+      if params['response'] in (self.__expectedResponse('2'), self.__expectedResponse('1')):
+        self.server.stats.count('logins')
+        sid = self.server.createSession()
+    elif self.server.useSession(params.get('sid')):
+      sid = params['sid']
+    self.__reply(200, self.__sessionInfo(sid, params.get('version')), 'text/xml')
+
+  # pages
+
+  def __page(self, path: str, params: dict):
+    if not self.server.useSession(params.get('sid')):
+      self.__reply(403, b'', 'text/html')
+      return
+
+    # a busy or slow box
+    time.sleep(self.server.delay)
+    name = path.strip('/').replace('/', '_')
+    if 'page' in params:
+      name += '_' + params['page']
+    try:
+      with open(FIXTURE_DIR + '/' + name, 'rb') as fixture:
+        body = fixture.read()
+    except OSError:
+      self.__reply(404, b'', 'text/html')
+      return
+    self.__reply(200, body, 'application/json' if name.startswith('data.lua') else 'text/html')
+
+  # TR-064
+
+  def __authorized(self) -> bool:
+    """checks the digest authentication (RFC 2617, qop=auth) of a SOAP request"""
+    header = self.headers.get('Authorization', '')
+    if not header.startswith('Digest '):
+      return False
+    fields = {}
+    for part in header[7:].split(','):
+      key, _, value = part.strip().partition('=')
+      fields[key] = value.strip('"')
+    ha1 = hashlib.md5('{}:{}:{}'.format(fields.get('username'), DIGEST_REALM, self.server.password).encode()).hexdigest()
+    ha2 = hashlib.md5('{}:{}'.format(self.command, fields.get('uri')).encode()).hexdigest()
+    expected = hashlib.md5(':'.join([ha1, fields.get('nonce', ''), fields.get('nc', ''), fields.get('cnonce', ''), fields.get('qop', ''), ha2]).encode()).hexdigest()
+    return fields.get('nonce') == self.server.nonce and fields.get('response') == expected
+
+  def __description(self) -> bytes:
+    services = ''.join(('<service><serviceType>{serviceType}</serviceType><serviceId>urn:{name}</serviceId>'
+                        '<controlURL>{controlURL}</controlURL><eventSubURL></eventSubURL><SCPDURL>{SCPDURL}</SCPDURL></service>').format(name=name, **service)
+                       for name, service in self.server.tr064['services'].items())
+    return ('<?xml version="1.0"?><root xmlns="urn:dslforum-org:device-1-0"><specVersion><major>1</major><minor>0</minor></specVersion>'
+            '<systemVersion><HW>226</HW><Major>154</Major><Minor>7</Minor><Patch>57</Patch><Buildnumber>0</Buildnumber><Display>{}</Display></systemVersion>'
+            '<device><deviceType>urn:dslforum-org:device:InternetGatewayDevice:1</deviceType><friendlyName>FritzboxStub</friendlyName>'
+            '<serviceList>{}</serviceList></device></root>').format(self.server.tr064['firmware'], services).encode()
+
+  def __scpd(self, service: dict) -> bytes:
+    actions = ''
+    variables = ''
+    for action, arguments in service['actions'].items():
+      argumentList = ''
+      for name, (dataType, value) in arguments.items():
+        argumentList += '<argument><name>{0}</name><direction>out</direction><relatedStateVariable>{1}{0}</relatedStateVariable></argument>'.format(name, action)
+        variables += '<stateVariable sendEvents="no"><name>{}{}</name><dataType>{}</dataType></stateVariable>'.format(action, name, dataType)
+      actions += '<action><name>{}</name><argumentList>{}</argumentList></action>'.format(action, argumentList)
+    return ('<?xml version="1.0"?><scpd xmlns="urn:dslforum-org:service-1-0"><specVersion><major>1</major><minor>0</minor></specVersion>'
+            '<actionList>{}</actionList><serviceStateTable>{}</serviceStateTable></scpd>').format(actions, variables).encode()
+
+  def __soap(self, service: dict):
+    self.__body()
+    if not self.__authorized():
+      self.__reply(401, b'', 'text/html', {'WWW-Authenticate': 'Digest realm="{}", nonce="{}", algorithm=MD5, qop="auth"'.format(DIGEST_REALM, self.server.nonce)})
+      return
+
+    action = self.headers.get('SOAPAction', '').strip('"').rpartition('#')[2]
+    if action not in service['actions']:
+      fault = ('<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><s:Fault><faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring>'
+               '<detail><UPnPError xmlns="urn:dslforum-org:control-1-0"><errorCode>401</errorCode><errorDescription>Invalid Action</errorDescription></UPnPError></detail>'
+               '</s:Fault></s:Body></s:Envelope>')
+      self.__reply(500, fault.encode(), 'text/xml')
+      return
+
+    arguments = ''.join('<{0}>{1}</{0}>'.format(name, escape(str(value))) for name, (dataType, value) in service['actions'][action].items())
+    envelope = ('<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+                '<s:Body><u:{0}Response xmlns:u="{1}">{2}</u:{0}Response></s:Body></s:Envelope>').format(action, service['serviceType'], arguments)
+    self.__reply(200, envelope.encode(), 'text/xml')
+
+  def __tr064(self, path: str) -> bool:
+    """answers TR-064 requests, returns False for other paths"""
+    if path == '/tr64desc.xml':
+      self.__reply(200, self.__description(), 'text/xml')
+      return True
+    for service in self.server.tr064['services'].values():
+      if path == service['SCPDURL']:
+        self.__reply(200, self.__scpd(service), 'text/xml')
+        return True
+      if path == service['controlURL'] and self.command == 'POST':
+        self.__soap(service)
+        return True
+    return False
+
+  def __handle(self):
+    self.server.stats.count('requests')
+    path = urlparse(self.path).path
+    if self.__tr064(path):
+      return
+    params = self.__params()
+    if path == '/login_sid.lua':
+      self.__loginSid(params)
+    else:
+      self.__page(path, params)
+
+  def do_GET(self):
+    self.__handle()
+
+  def do_POST(self):
+    self.__handle()
+
+class FritzboxStub(ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, password: str, certificate: str = None, key: str = None, md5: bool = False, sessionTimeout: int = 1200):
+    """
+    :param md5: offer legacy MD5 challenges only, like FRITZ!OS before 7.24
+    :param sessionTimeout: seconds after which an unused SID expires
+    """
+    super().__init__(('127.0.0.1', 0), FritzboxStubHandler)
+    self.password = password
+    self.md5 = md5
+    self.md5Challenge = os.urandom(4).hex()
+    self.nonce = os.urandom(8).hex()
+    self.sessionTimeout = sessionTimeout
+    # seconds to wait before answering a page
+    self.delay = 0
+    self.sessions = {}
+    self.sessionLock = threading.Lock()
+    self.stats = FritzboxStubStats()
+    with open(FIXTURE_DIR + '/tr064.json', 'r') as fixture:
+      self.tr064 = json.load(fixture)
+    self.context = None
+    if certificate:
+      self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+      self.context.load_cert_chain(certificate, key)
+
+  @property
+  def port(self) -> int:
+    return self.server_address[1]
+
+  def createSession(self) -> str:
+    sid = os.urandom(8).hex()
+    with self.sessionLock:
+      self.sessions[sid] = time.time()
+    return sid
+
+  def useSession(self, sid) -> bool:
+    """checks a SID and restarts its idle time, expired sessions are dropped"""
+    with self.sessionLock:
+      if sid not in self.sessions:
+        return False
+      if time.time() - self.sessions[sid] > self.sessionTimeout:
+        del self.sessions[sid]
+        return False
+      self.sessions[sid] = time.time()
+      return True
+
+  def expireSessions(self):
+    """drops all sessions, like a reboot of the box"""
+    with self.sessionLock:
+      self.sessions.clear()
+
+  def start(self):
+    threading.Thread(target=self.serve_forever, daemon=True).start()
+
+  def stop(self):
+    self.shutdown()
+    self.server_close()
+
+def create_certificate(directory: str) -> tuple:
+  """creates a self-signed certificate for 127.0.0.1 using the openssl command line tool"""
+  certificate = directory + '/box.cer'
+  key = directory + '/box.key'
+  subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                  '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+                  '-keyout', key, '-out', certificate], check=True, capture_output=True)
+  return (certificate, key)
+
+def configure_environment(stub: FritzboxStub, statedir: str, certificate: str = None):
+  """points FritzboxConfig at the stub"""
+  os.environ['fritzbox_ip'] = '127.0.0.1'
+  os.environ['fritzbox_port'] = str(stub.port)
+  os.environ['fritzbox_tr064_port'] = str(stub.port)
+  os.environ['fritzbox_user'] = 'munin'
+  os.environ['fritzbox_password'] = stub.password
+  os.environ['fritzbox_use_tls'] = 'true' if certificate else 'false'
+  os.environ['MUNIN_PLUGSTATE'] = statedir
+  if certificate:
+    os.environ['fritzbox_certificate'] = certificate
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+  bench_connection_pool - counts the TCP connections and TLS handshakes of a plugin run
+
+  Runs fritzbox_ecostat against the local FritzboxStub over TLS, once with a cold
+  session (login challenge, login response, page) and once with a stored session.
+  Before connection pooling every HTTP request opened its own connection, so the
+  request count is the number of handshakes the unpooled interface needed.
+
+  usage: python3 benchmark/bench_connection_pool.py [runs]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from FritzboxStub import FritzboxStub, create_certificate, configure_environment
+
+PLUGIN = os.path.dirname(os.path.abspath(__file__)) + '/../src/fritzbox_ecostat.py'
+
+def run_plugin(stub: FritzboxStub) -> tuple:
+  stub.stats.reset()
+  start = time.perf_counter()
+  subprocess.run([sys.executable, PLUGIN], check=True, capture_output=True)
+  elapsed = time.perf_counter() - start
+  return (stub.stats.requests, stub.stats.connections, elapsed)
+
+def main():
+  runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+  workdir = tempfile.mkdtemp()
+  try:
+    certificate, key = create_certificate(workdir)
+    stub = FritzboxStub('benchmark', certificate, key)
+    stub.start()
+    configure_environment(stub, workdir, certificate)
+    os.environ['ecostat_modes'] = 'cpu temp ram'
+    os.environ['fritzbox_cache_max_age'] = '0'
+
+    print('%-8s %8s %12s %12s %10s' % ('session', 'requests', 'handshakes', 'saved', 'time [ms]'))
+    for i in range(runs):
+      shutil.rmtree(workdir + '/fritzbox', ignore_errors=True)
+      requests, connections, elapsed = run_plugin(stub)
+      print('%-8s %8d %12d %12d %10.1f' % ('cold', requests, connections, requests - connections, elapsed * 1000))
+      requests, connections, elapsed = run_plugin(stub)
+      print('%-8s %8d %12d %12d %10.1f' % ('warm', requests, connections, requests - connections, elapsed * 1000))
+    stub.stop()
+  finally:
+    shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+  main()
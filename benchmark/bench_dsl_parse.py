@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+  bench_dsl_parse - measures the time to extract the DSL statistics from the recorded page
+
+  Compares the former XPath queries (one per value, by table and row position)
+  with read_tables() of the plugin, which finds the rows by their labels in one
+  walk over the page.
+
+  usage: python3 benchmark/bench_dsl_parse.py [runs]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/../src')
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__)) + '/fixtures'
+
+# table, row and column of every value the plugin printed before
+XPATHS = [(1, 4, 3), (1, 4, 4), (1, 5, 3), (1, 5, 4), (1, 13, 3), (1, 13, 4), (1, 15, 3), (1, 15, 4),
+          (4, 3, 2), (4, 3, 3), (4, 4, 2), (4, 4, 3), (4, 7, 2), (4, 7, 3), (4, 11, 2), (4, 11, 3), (4, 15, 2), (4, 15, 3)]
+
+def parse_xpath(data: bytes):
+  from lxml import html
+  root = html.fragments_fromstring(data)
+  return [root[t].xpath('tr[position() = %d]/td[position() = %d]' % (r, c))[0].text for t, r, c in XPATHS]
+
+def measure(parse, data, runs: int) -> float:
+  start = time.perf_counter()
+  for i in range(runs):
+    parse(data)
+  return (time.perf_counter() - start) / runs
+
+def main():
+  runs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+  from fritzbox_dsl import read_tables
+  with open(FIXTURE_DIR + '/internet_dsl_stats_tab.lua', 'rb') as fixture:
+    page = fixture.read()
+
+  print('xpath query per value: %8.1f us' % (measure(parse_xpath, page, runs) * 1e6))
+  print('rows by label:         %8.1f us' % (measure(read_tables, page, runs) * 1e6))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+  bench_json - measures decoding the data.lua pages
+
+  Compares json.loads and orjson.loads (if orjson is installed) of the whole
+  page, and FritzboxJson.extract() of the key paths the plugins request with
+  either, by time and by peak memory. Besides the recorded pages, an ecoStat
+  page with the 24h series of every graph and a chan page with a crowded scan
+  list are generated.
+
+  usage: python3 benchmark/bench_json.py [runs]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/../src')
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__)) + '/fixtures'
+
+def generate_ecostat() -> bytes:
+  """the ecoStat page of the 24h view, a sample per minute for every graph"""
+  def graph(series):
+    return {'series': [[random.randint(0, 100) for i in range(1440)] for s in range(series)],
+            'labels': [time.strftime('%H:%M', time.gmtime(i * 60)) for i in range(1440)]}
+  data = {'cpuutil': graph(1), 'cputemp': graph(1), 'ramusage': graph(3), 'ledEnergy': graph(1), 'energy': graph(4)}
+  return json.dumps({'pid': 'ecoStat', 'data': data}).encode()
+
+def generate_chan() -> bytes:
+  """the chan page with 150 neighbouring access points"""
+  scanlist = [{'ssid': 'FRITZ!Box 7590 %03d' % i, 'mac': '00:11:22:33:44:%02x' % (i % 256), 'bandId': ('24ghz', '5ghz')[i % 2],
+               'channel': i % 13 + 1, 'rssi': -random.randint(40, 90), 'isEnvNet': True, 'lastSeen': 'älter'} for i in range(150)]
+  band = {'airtimedata': ','.join(str(random.randint(0, 100)) for i in range(606)), 'usedChannels': [1, 6]}
+  return json.dumps({'pid': 'chan', 'data': {'scanlist': scanlist, '24ghz': band, '5ghz': band}}).encode()
+
+def measure(decode, content, runs: int) -> tuple:
+  """returns the time per run and the peak of the memory allocated by a run"""
+  start = time.perf_counter()
+  for i in range(runs):
+    decode(content)
+  elapsed = (time.perf_counter() - start) / runs
+  tracemalloc.start()
+  decode(content)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return (elapsed, peak)
+
+def main():
+  runs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+  random.seed(0)
+  import FritzboxJson
+  decoders = [('json.loads', json.loads)]
+  backends = [None]
+  if FritzboxJson.orjson is not None:
+    decoders.append(('orjson.loads', FritzboxJson.orjson.loads))
+    backends.append(FritzboxJson.orjson)
+
+  with open(FIXTURE_DIR + '/data.lua_ecoStat', 'rb') as fixture:
+    ecostat = fixture.read()
+  with open(FIXTURE_DIR + '/data.lua_chan', 'rb') as fixture:
+    chan = fixture.read()
+  ecostatPaths = [('data', 'cpuutil'), ('data', 'cputemp'), ('data', 'ramusage')]
+  pages = [('ecoStat', ecostat, ecostatPaths), ('ecoStat 24h', generate_ecostat(), ecostatPaths),
+           ('chan', chan, None), ('chan 150 APs', generate_chan(), None)]
+
+  for name, content, paths in pages:
+    print('%s (%d bytes)' % (name, len(content)))
+    for decoder, decode in decoders:
+      elapsed, peak = measure(decode, content, runs)
+      print('  %-24s %8.1f us %8.1f KiB' % (decoder, elapsed * 1e6, peak / 1024))
+    # wifi_load reads the whole chan page
+    for backend in backends if paths else []:
+      FritzboxJson.orjson = backend
+      elapsed, peak = measure(lambda content: FritzboxJson.extract(content, paths), content, runs)
+      print('  %-24s %8.1f us %8.1f KiB' % ('extract' + ('', ' (orjson)')[backend is not None], elapsed * 1e6, peak / 1024))
+
+if __name__ == '__main__':
+  main()
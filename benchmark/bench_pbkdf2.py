@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+  bench_pbkdf2 - measures the CPU time of the PBKDF2 login response
+
+  Compares a login computing both PBKDF2 stages with a login reusing the stored
+  static-salt stage. The iteration counts are the ones of the example challenge
+  in AVM's technical note on session IDs.
+
+  usage: python3 benchmark/bench_pbkdf2.py [runs]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/../src')
+CHALLENGE = '2$10000$5A1711$2000$5A1722'
+
+def measure(interface, runs: int, cached: bool) -> float:
+  total = 0.0
+  for i in range(runs):
+    if not cached:
+      shutil.rmtree(os.environ['MUNIN_PLUGSTATE'] + '/fritzbox', ignore_errors=True)
+    start = time.process_time()
+    interface._FritzboxInterface__calculate_pbkdf2_response(CHALLENGE)
+    total += time.process_time() - start
+  return total / runs
+
+def main():
+  runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+  workdir = tempfile.mkdtemp()
+  try:
+    os.environ['MUNIN_PLUGSTATE'] = workdir
+    os.environ['fritzbox_user'] = 'munin'
+    os.environ['fritzbox_password'] = 'benchmark'
+    from FritzboxInterface import FritzboxInterface
+    interface = FritzboxInterface(useCollector=False)
+
+    uncached = measure(interface, runs, False)
+    interface._FritzboxInterface__calculate_pbkdf2_response(CHALLENGE)
+    cached = measure(interface, runs, True)
+    print('both stages:      %8.2f ms' % (uncached * 1000))
+    print('cached 1st stage: %8.2f ms' % (cached * 1000))
+    print('saved per login:  %8.2f ms (%.0f%%)' % ((uncached - cached) * 1000, 100 * (uncached - cached) / uncached))
+  finally:
+    shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+  main()
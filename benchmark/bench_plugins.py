@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+  bench_plugins - runs every fritzbox_*.py entry point against the FritzboxStub
+
+  Each plugin is run with `config` and `fetch`, first with an empty plugin state
+  (no session, no cached responses) and then again with the state the previous
+  runs left behind. For every run the median wall time and the HTTP requests,
+  bytes transferred and logins the stub saw are printed, giving a baseline to
+  compare performance changes against.
+
+  usage: python3 benchmark/bench_plugins.py [-h] [--runs N] [--tls] [--md5] [--no-cache] [plugin ...]
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import statistics
+import tempfile
+import subprocess
+from FritzboxStub import FritzboxStub, create_certificate, configure_environment
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__)) + '/../src'
+ENVIRONMENT = {
+  'all_plugins': 'connection_uptime dsl ecostat energy link_saturation smart_home smart_home_temperature traffic wifi_load',
+  'dsl_modes': 'capacity rate snr damping errors crc ecc',
+  'ecostat_modes': 'cpu temp ram',
+  'energy_modes': 'power devices uptime',
+  'energy_product': 'DSL',
+  'wifi_freqs': '24 5',
+  'wifi_modes': 'freqs neighbors',
+}
+
+def run_plugin(stub: FritzboxStub, plugin: str, command: str) -> dict:
+  stub.stats.reset()
+  start = time.perf_counter()
+  result = subprocess.run([sys.executable, plugin, command], cwd=SRC_DIR, capture_output=True)
+  elapsed = time.perf_counter() - start
+  stats = stub.stats.snapshot()
+  stats['time'] = elapsed
+  stats['failed'] = result.returncode != 0 or b'.value' not in result.stdout and command == 'fetch'
+  return stats
+
+def measure(stub: FritzboxStub, statedir: str, plugin: str, command: str, cold: bool, runs: int) -> dict:
+  """returns the median time and the counters of the last of several runs"""
+  times = []
+  for i in range(runs):
+    if cold:
+      shutil.rmtree(statedir + '/fritzbox', ignore_errors=True)
+    stats = run_plugin(stub, plugin, command)
+    times.append(stats['time'])
+  stats['time'] = statistics.median(times)
+  return stats
+
+def main():
+  parser = argparse.ArgumentParser(description='Runs the fritzbox_*.py plugins against a local FRITZ!Box stub.')
+  parser.add_argument('plugins', nargs='*', help='plugin names, e.g. ecostat (default: all)')
+  parser.add_argument('--runs', type=int, default=3, help='runs per measurement, the median time is printed')
+  parser.add_argument('--tls', action='store_true', help='connect via TLS')
+  parser.add_argument('--md5', action='store_true', help='offer legacy MD5 login challenges only')
+  parser.add_argument('--no-cache', action='store_true', help='disable the response cache')
+  args = parser.parse_args()
+
+  plugins = sorted(os.path.basename(p) for p in glob.glob(SRC_DIR + '/fritzbox_*.py'))
+  if args.plugins:
+    plugins = [p for p in plugins if p[len('fritzbox_'):-len('.py')] in args.plugins]
+
+  workdir = tempfile.mkdtemp()
+  try:
+    certificate, key = create_certificate(workdir) if args.tls else (None, None)
+    stub = FritzboxStub('benchmark', certificate, key, md5=args.md5)
+    stub.start()
+    configure_environment(stub, workdir, certificate)
+    os.environ.update(ENVIRONMENT)
+    os.environ.pop('MUNIN_CAP_DIRTYCONFIG', None)
+    if args.no_cache:
+      os.environ['fritzbox_cache_max_age'] = '0'
+
+    print('%-36s %-8s %-5s %10s %9s %10s %7s' % ('plugin', 'command', 'state', 'time [ms]', 'requests', 'bytes', 'logins'))
+    totals = {'time': 0.0, 'requests': 0, 'bytes': 0, 'logins': 0}
+    for plugin in plugins:
+      for cold in (True, False):
+        for command in ('config', 'fetch'):
+          stats = measure(stub, workdir, plugin, command, cold and command == 'config', args.runs)
+          for counter in totals:
+            totals[counter] += stats[counter]
+          print('%-36s %-8s %-5s %10.1f %9d %10d %7d%s' % (plugin, command, ('warm', 'cold')[cold and command == 'config'], stats['time'] * 1000,
+                                                            stats['requests'], stats['bytes'], stats['logins'], '  FAILED' if stats['failed'] else ''))
+    print('%-36s %-8s %-5s %10.1f %9d %10d %7d' % ('total', '', '', totals['time'] * 1000, totals['requests'], totals['bytes'], totals['logins']))
+    stub.stop()
+  finally:
+    shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+  bench_series - measures the reduction of the Fritzbox data series
+
+  Compares the former per-plugin loops, which only computed the average, with
+  FritzboxSeries parsing the series into arrays and computing average, minimum,
+  maximum, 95th and 99th percentile. The Fritzbox delivers 300 points today,
+  the larger series show how both scale.
+
+  usage: python3 benchmark/bench_series.py [runs]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/../src')
+SIZES = [300, 1500, 3000, 10000]
+
+def average_load(datapoints):
+  """the former fritzbox_wifi_load loop"""
+  recv = 0
+  send = 0
+  for d in datapoints:
+    parts = d.split(u':')
+    recv += int(parts[0])
+    send += int(parts[1])
+  datalen = len(datapoints)
+  return (recv // datalen, send // datalen)
+
+def average_bps(datapoints):
+  """the former fritzbox_link_saturation loop"""
+  avg = 0
+  for d in datapoints:
+    avg += d
+  return avg // len(datapoints)
+
+def measure(function, data, runs: int) -> float:
+  start = time.perf_counter()
+  for i in range(runs):
+    function(data)
+  return (time.perf_counter() - start) / runs * 1e6
+
+def main():
+  runs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+  from FritzboxSeries import SeriesStats, parse_series, parse_pair_series
+
+  def pair_stats(datapoints):
+    return [SeriesStats(series) for series in parse_pair_series(datapoints)]
+
+  def number_stats(datapoints):
+    return SeriesStats(parse_series(datapoints))
+
+  print('%8s %22s %22s %22s %22s' % ('points', 'pairs: avg loop [us]', 'pairs: all stats [us]', 'numbers: avg loop [us]', 'numbers: all stats [us]'))
+  random.seed(0)
+  for size in SIZES:
+    pairs = ['%d:%d' % (random.randint(0, 100), random.randint(0, 100)) for i in range(size)]
+    numbers = [random.randint(0, 25000000) for i in range(size)]
+    assert average_load(pairs) == tuple(int(stats.avg) for stats in pair_stats(pairs))
+    print('%8d %22.1f %22.1f %22.1f %22.1f' % (size, measure(average_load, pairs, runs), measure(pair_stats, pairs, runs),
+                                              measure(average_bps, numbers, runs), measure(number_stats, numbers, runs)))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+  bench_startup - records the import and startup time of every fritzbox_*.py entry point
+
+  For each plugin the cumulative import time of the module (python -X importtime)
+  and the median wall time of an `autoconf` run are printed, next to the bare
+  interpreter startup as a baseline. Heavy modules (requests, lxml)
+  are imported in the code paths needing them, so they don't show up here.
+
+  usage: python3 benchmark/bench_startup.py [runs]
+"""
+
+import os
+import sys
+import glob
+import time
+import statistics
+import tempfile
+import subprocess
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__)) + '/../src'
+
+def import_time(module: str) -> int:
+  """returns the cumulative import time of a module in microseconds"""
+  result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                          cwd=SRC_DIR, check=True, capture_output=True, text=True)
+  for line in result.stderr.splitlines():
+    parts = line.split('|')
+    if len(parts) == 3 and parts[2].strip() == module:
+      return int(parts[1])
+  return 0
+
+def startup_time(args: list, runs: int) -> float:
+  """returns the median wall time of a command in milliseconds"""
+  times = []
+  for i in range(runs):
+    start = time.perf_counter()
+    subprocess.run(args, cwd=SRC_DIR, check=True, capture_output=True)
+    times.append(time.perf_counter() - start)
+  return statistics.median(times) * 1000
+
+def main():
+  runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+  os.environ['MUNIN_PLUGSTATE'] = tempfile.gettempdir()
+  print('%-40s %12s %14s' % ('entry point', 'import [ms]', 'autoconf [ms]'))
+  print('%-40s %12s %14.1f' % ('(interpreter)', '-', startup_time([sys.executable, '-c', 'pass'], runs)))
+  for plugin in sorted(glob.glob(SRC_DIR + '/fritzbox_*.py')):
+    name = os.path.basename(plugin)
+    print('%-40s %12.1f %14.1f' % (name, import_time(name[:-3]) / 1000, startup_time([sys.executable, name, 'autoconf'], runs)))
+
+if __name__ == '__main__':
+  main()
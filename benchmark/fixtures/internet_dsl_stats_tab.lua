@@ -0,0 +1,41 @@
+<h4>Übertragungsparameter</h4>
+<table class="zebra" id="uiTransmission">
+<tr><th></th><th></th><th>Empfangsrichtung</th><th>Senderichtung</th></tr>
+<tr><td>DSLAM-Datenrate Max.</td><td>kbit/s</td><td>292000</td><td>46720</td></tr>
+<tr><td>DSLAM-Datenrate Min.</td><td>kbit/s</td><td>16000</td><td>1024</td></tr>
+<tr><td>Leitungskapazität</td><td>kbit/s</td><td>247561</td><td>46938</td></tr>
+<tr><td>Aktuelle Datenrate</td><td>kbit/s</td><td>236886</td><td>46719</td></tr>
+<tr><td>Nahtlose Ratenadaption</td><td></td><td>aus</td><td>aus</td></tr>
+<tr><td>Latenz</td><td></td><td>fast</td><td>fast</td></tr>
+<tr><td>Impulsstörungsschutz (INP)</td><td></td><td>0</td><td>0</td></tr>
+<tr><td>G.INP</td><td></td><td>an</td><td>an</td></tr>
+<tr><td>Trägertausch (Bitswap)</td><td></td><td>an</td><td>an</td></tr>
+<tr><td>Power Cut Back</td><td>dB</td><td>0</td><td>-</td></tr>
+<tr><td>Trellis-Codierung</td><td></td><td>an</td><td>an</td></tr>
+<tr><td>Störabstandsmarge</td><td>dB</td><td>8</td><td>9</td></tr>
+<tr><td>Leistungsdämpfung (PSD)</td><td>dB</td><td>-</td><td>-</td></tr>
+<tr><td>Leitungsdämpfung</td><td>dB</td><td>14</td><td>12</td></tr>
+<tr><td>Näherungsweise Leitungslänge</td><td>m</td><td>342</td><td>-</td></tr>
+<tr><td>Profil</td><td></td><td>35b</td><td>35b</td></tr>
+</table>
+<h4>Statistik</h4>
+<p>Die Fehlerzähler werden beim Neusynchronisieren der DSL-Verbindung zurückgesetzt.<br>Stand: 16.10.2026 21:04</p>
+<table class="zebra" id="uiErrors">
+<tr><th></th><th>FRITZ!Box</th><th>Vermittlungsstelle</th></tr>
+<tr><th colspan="3">Sekunden mit Fehlern</th></tr>
+<tr><td>Sekunden mit Fehlern (ES)</td><td>21</td><td>118</td></tr>
+<tr><td>Sekunden mit vielen Fehlern (SES)</td><td>3</td><td>7</td></tr>
+<tr><td>Sekunden ohne Fehler</td><td>1034829</td><td>1034732</td></tr>
+<tr><th colspan="3">Nicht behebbare Fehler (CRC)</th></tr>
+<tr><td>CRC-Fehler pro Minute</td><td>0.02</td><td>0.00</td></tr>
+<tr><td>CRC-Fehler letzte 15 Minuten</td><td>1</td><td>0</td></tr>
+<tr><td>CRC-Fehler gesamt</td><td>5174</td><td>812</td></tr>
+<tr><th colspan="3">Korrigierbare Fehler (FEC)</th></tr>
+<tr><td>Korrigierbare Fehler pro Minute</td><td>31.87</td><td>0.41</td></tr>
+<tr><td>Korrigierbare Fehler letzte 15 Minuten</td><td>452</td><td>5</td></tr>
+<tr><td>Korrigierbare Fehler gesamt</td><td>31980775</td><td>401246</td></tr>
+<tr><th colspan="3">Nicht korrigierbare Fehler</th></tr>
+<tr><td>Nicht korrigierbare Fehler pro Minute</td><td>0.01</td><td>0.00</td></tr>
+<tr><td>Nicht korrigierbare Fehler letzte 15 Minuten</td><td>0</td><td>0</td></tr>
+<tr><td>Nicht korrigierbare Fehler gesamt</td><td>2310</td><td>17</td></tr>
+</table>
@@ -0,0 +1 @@
+[{"upstream": "46719", "downstream": "236886", "mode": "VDSL"}]
\ No newline at end of file
@@ -0,0 +1,3 @@
+<devicelist version="1" fwversion="7.57"><device identifier="11630 0123141" id="16" functionbitmask="35712" fwversion="04.16" manufacturer="AVM" productname="FRITZ!DECT 200"><present>1</present><txbusy>0</txbusy><name>Kitchen</name><switch><state>1</state><mode>manuell</mode><lock>0</lock><devicelock>0</devicelock></switch><simpleonoff><state>1</state></simpleonoff><powermeter><voltage>230051</voltage><power>12340</power><energy>75519</energy></powermeter><temperature><celsius>225</celsius><offset>0</offset></temperature></device>
+<device identifier="09995 0335100" id="17" functionbitmask="320" fwversion="05.08" manufacturer="AVM" productname="FRITZ!DECT 301"><present>0</present><txbusy>0</txbusy><name>Bath</name><battery>80</battery><batterylow>0</batterylow><temperature><celsius></celsius><offset></offset></temperature><hkr><tist></tist><windowopenactiv>0</windowopenactiv></hkr></device>
+<group identifier="grp303E4F-3F7A1A" id="900" functionbitmask="6784"><present>1</present><name>All</name><groupinfo><masterdeviceid>0</masterdeviceid><members>16</members></groupinfo></group></devicelist>
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+  FritzboxAsyncInterface - asyncio counterpart of FritzboxInterface
+
+  Login, session handling (PBKDF2 and MD5), response cache and collector are the
+  ones of FritzboxInterface. The blocking requests run in worker threads over its
+  pooled HTTP session, so several pages can be awaited concurrently, e.g.
+
+    interface = FritzboxAsyncInterface()
+    ecostat, devices = await asyncio.gather(
+      interface.postPage('data.lua', {'page': 'ecoStat', 'xhr': 1}),
+      interface.getPage('webservices/homeautoswitch.lua', {'switchcmd': 'getdevicelistinfos'}))
+
+  Concurrent requests needing a new session wait for a single login. Errors are
+  raised as FritzboxError subclasses (see FritzboxExceptions) instead of exiting.
+  All requests share the deadline of the box in FritzboxDeadline, long running
+  callers start a new one per batch of requests with FritzboxDeadline.start_run().
+"""
+
+import asyncio
+from FritzboxConfig import FritzboxConfig
+from FritzboxInterface import FritzboxInterface
+
+class FritzboxAsyncInterface:
+  config = None
+  __interface = None
+
+  # default constructor
+  def __init__(self, useCollector: bool = True, config: FritzboxConfig = None):
+    self.__interface = FritzboxInterface(useCollector, config)
+    self.config = self.__interface.config
+
+  async def getPage(self, page: str, data={}, maxAge: int = None) -> bytes:
+    """Fetches a page, reusing a cached response if it is younger than maxAge seconds
+
+    :param maxAge: overrides the configured fritzbox_cache_max_age, 0 disables the cache
+    :raises FritzboxError: if the page could not be fetched
+    """
+    return await asyncio.to_thread(self.__interface.requestPage, 'GET', page, data, maxAge)
+
+  async def postPage(self, page: str, data={}, maxAge: int = None, paths: list = None):
+    """Posts to a JSON page, reusing a cached response if it is younger than maxAge seconds
+
+    :param maxAge: overrides the configured fritzbox_cache_max_age, 0 disables the cache
+    :param paths: the key paths to return, e.g. [('data', 'drain')], the whole page if None
+    :return: the parsed JSON
+    :raises FritzboxError: if the page could not be fetched or is no JSON
+    """
+    return await asyncio.to_thread(self.__interface.requestJson, page, data, maxAge, paths)
+
+  async def fetchPage(self, method: str, page: str, data={}) -> bytes:
+    """Fetches a page directly from the Fritzbox, bypassing cache and collector
+
+    :param method: 'GET' or 'POST'
+    :raises FritzboxError: if the page could not be fetched
+    """
+    return await asyncio.to_thread(self.__interface.requestPageFromBox, method, page, data)
+
+  def getScrapeStats(self) -> dict:
+    """returns the timings and counters of the requests to the Fritzbox, see FritzboxScrapeStats"""
+    return self.__interface.getScrapeStats()
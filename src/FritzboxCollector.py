@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+  FritzboxCollector - an optional daemon keeping one authenticated Fritzbox session
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  The collector keeps the latest response of every page the plugins request in
+  memory and refreshes them on a schedule. Plugins ask the collector over a local
+  Unix socket first and only scrape the Fritzbox directly if it is not running.
+  Pages are registered on their first request and dropped from the schedule when
+  no plugin asked for them for a while.
+
+  Start it with the same environment as the munin plugins, e.g. from a systemd unit:
+
+  MUNIN_PLUGSTATE=/var/lib/munin-node/plugin-state/nobody \
+  fritzbox_ip=... fritzbox_user=... fritzbox_password=... \
+  python3 /usr/share/munin/plugins/FritzboxCollector.py
+
+  env.fritzbox_collector_socket [path of the Unix socket, optional]
+  env.fritzbox_collector_interval [seconds between two refreshes, optional]
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import socketserver
+from FritzboxResponseCache import FritzboxResponseCache
+from FritzboxDeadline import start_run
+from FritzboxScrapeStats import flush_all
+
+# drop pages from the schedule when no plugin requested them for this many seconds
+EXPIRY = 900
+
+def get_endpoint_key(box: str, method: str, page: str, data: dict) -> str:
+  return box + ' ' + method + ' ' + page + '?' + FritzboxResponseCache.normalizeParams(data)
+
+class FritzboxCollectorHandler(socketserver.StreamRequestHandler):
+  def handle(self):
+    try:
+      request = json.loads(self.rfile.readline())
+      content = self.server.collector.get(request['box'], request['method'], request['page'], request['data'])
+    except (ValueError, KeyError, TypeError):
+      content = None
+
+    if content is None:
+      self.wfile.write(b'ERROR 0\n')
+    else:
+      self.wfile.write(b'OK ' + str(len(content)).encode() + b'\n' + content)
+
+class FritzboxCollectorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+
+class FritzboxCollector:
+  config = None
+  __interface = None
+  __box = ""
+
+  # default constructor
+  def __init__(self):
+    # imported here to keep the plugins' client import light
+    from FritzboxInterface import FritzboxInterface
+    from FritzboxFileSession import FritzboxFileSession
+    self.__interface = FritzboxInterface(useCollector=False)
+    self.config = self.__interface.config
+    self.__box = FritzboxFileSession(self.config.server, self.config.user, self.config.port).getSessionName()
+    self.__lock = threading.Lock()
+    self.__endpoints = {}
+    self.__snapshots = {}
+    self.__pageLocks = {}
+
+  def get(self, box: str, method: str, page: str, data: dict) -> bytes:
+    """returns the latest snapshot of a page, fetching and scheduling it if it is unknown or outdated
+
+    :param box: the session name of the box the plugin polls, None is returned for any other box
+    """
+    if box != self.__box:
+      return None
+    key = get_endpoint_key(box, method, page, data)
+    with self.__lock:
+      self.__endpoints[key] = (method, page, data, time.time())
+      snapshot = self.__snapshots.get(key)
+    if self.__isRecent(snapshot):
+      return snapshot[1]
+    return self.__refresh(key, method, page, data, True)
+
+  def __isRecent(self, snapshot: tuple) -> bool:
+    return snapshot is not None and time.time() - snapshot[0] < 2 * self.config.collectorInterval
+
+  def __getPageLock(self, key: str):
+    with self.__lock:
+      return self.__pageLocks.setdefault(key, threading.Lock())
+
+  def __refresh(self, key: str, method: str, page: str, data: dict, reuseRecent: bool = False) -> bytes:
+    """fetches a page, a slow page only holds up the plugins waiting for the same page"""
+    try:
+      with self.__getPageLock(key):
+        if reuseRecent:
+          # another plugin may have waited for the same page and got it refreshed meanwhile
+          with self.__lock:
+            snapshot = self.__snapshots.get(key)
+          if self.__isRecent(snapshot):
+            return snapshot[1]
+        start_run(self.config)
+        content = self.__interface.requestPageFromBox(method, page, data)
+        if method == 'POST':
+          json.loads(content)
+        with self.__lock:
+          self.__snapshots[key] = (time.time(), content)
+      return content
+    except Exception as e:
+      # FritzboxError or invalid JSON, keep serving the other pages
+      print("Couldn't refresh " + key + ": " + str(e), file=sys.stderr)
+      return None
+
+  def poll(self):
+    """refreshes all scheduled pages forever"""
+    while True:
+      time.sleep(self.config.collectorInterval)
+      with self.__lock:
+        endpoints = list(self.__endpoints.items())
+      for key, (method, page, data, lastRequest) in endpoints:
+        if time.time() - lastRequest > EXPIRY:
+          with self.__lock:
+            del self.__endpoints[key]
+            self.__snapshots.pop(key, None)
+            self.__pageLocks.pop(key, None)
+          continue
+        self.__refresh(key, method, page, data)
+      # a run of the daemon is one round of refreshes
+      flush_all()
+
+  def serve(self):
+    socketPath = self.config.collectorSocket
+    if os.path.exists(socketPath):
+      os.remove(socketPath)
+    os.makedirs(os.path.dirname(socketPath), exist_ok=True)
+
+    server = FritzboxCollectorServer(socketPath, FritzboxCollectorHandler)
+    server.collector = self
+    # the socket carries the same data as the web interface, keep it private to the munin user
+    os.chmod(socketPath, 0o600)
+    threading.Thread(target=self.poll, daemon=True).start()
+    try:
+      server.serve_forever()
+    finally:
+      server.server_close()
+      os.remove(socketPath)
+
+if __name__ == "__main__":
+  # clean up the socket when stopped by systemd
+  signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+  try:
+    FritzboxCollector().serve()
+  except KeyboardInterrupt:
+    pass
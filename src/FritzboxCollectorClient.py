@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import os
+import json
+
+class FritzboxCollectorClient:
+  """asks a running collector for a page, so plugins don't need to log into the Fritzbox themselves"""
+  __socketPath = ""
+  __box = ""
+
+  # default constructor
+  def __init__(self, socketPath: str, box: str):
+    """
+    :param box: the session name of the box (server, port and user), a collector only serves its own box
+    """
+    self.__socketPath = socketPath
+    self.__box = box
+
+  def request(self, method: str, page: str, data: dict, timeout: float) -> bytes:
+    """returns the page content, or None if the collector is not available
+
+    :param timeout: the seconds to wait for the collector, the time left of the run (see FritzboxDeadline)
+    """
+    if not os.path.exists(self.__socketPath):
+      return None
+
+    import socket
+
+    params = {k: v for k, v in data.items() if k != 'sid'}
+    request = json.dumps({'box': self.__box, 'method': method, 'page': page, 'data': params}) + '\n'
+    try:
+      with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(self.__socketPath)
+        sock.sendall(request.encode())
+        reply = sock.makefile('rb')
+        status = reply.readline().split()
+        if len(status) != 2 or status[0] != b'OK':
+          return None
+        return reply.read(int(status[1]))
+    except (OSError, ValueError):
+      # collector is not running (stale socket) or did not answer in time, scrape directly
+      return None
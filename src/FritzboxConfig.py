@@ -1,5 +1,15 @@
 import os
 
+def get_targets() -> list:
+  """returns the names of the boxes listed in env.fritzbox_targets, empty for a single box"""
+  return os.getenv('fritzbox_targets', '').split()
+
+def get_option(name: str, config: 'FritzboxConfig' = None, default: str = None) -> str:
+  """reads a plugin option, env.<target>_<name> of a box of a fleet falls back to env.<name>"""
+  if config is not None and config.target is not None and os.getenv(config.target + '_' + name):
+    return os.getenv(config.target + '_' + name)
+  return os.getenv(name, default)
+
 class FritzboxConfig:
   """the server address of the Fritzbox (ip or name)"""
   server = "fritz.box"
@@ -10,17 +20,73 @@ class FritzboxConfig:
   """the password to log into the Fritzbox webinterface"""
   password = ""
   useTls = True
+  """the port of the TR-064 interface"""
+  tr064Port = None # defaults to 49000 for useTls=False, 49443 for useTls=True
   certificateFile = str(os.getenv('MUNIN_CONFDIR')) + '/box.cer'
+  """the maximum age in seconds of cached page responses, 0 disables the cache"""
+  cacheMaxAge = 60
+  """the seconds a plugin run may wait for the Fritzbox in total, munin-node kills plugins after 10 seconds"""
+  timeout = 8
+  """the seconds a plugin waits for its values before printing the last ones (see FritzboxRevalidate)"""
+  staleThreshold = 2
+  """the maximum age in seconds of the last values a plugin may print instead, 0 disables it"""
+  maxStaleness = 0
+  """the Unix socket of the optional collector daemon"""
+  collectorSocket = str(os.getenv('MUNIN_PLUGSTATE')) + '/fritzbox/collector.sock'
+  """the seconds between two refreshes of the collector daemon"""
+  collectorInterval = 60
+  """the name of the box in env.fritzbox_targets, None for a single box"""
+  target = None
+  """the munin host the graphs of the box are shown for, None for the host of munin-node"""
+  hostName = None
+  """the address and port the optional Prometheus exporter listens on"""
+  exporterAddress = "127.0.0.1"
+  exporterPort = 9714
+  """the seconds the exporter serves the same collection to all scrapers"""
+  exporterInterval = 60
 
   # default constructor
-  def __init__(self):
-    if os.getenv('fritzbox_ip'):
-      self.server = str(os.getenv('fritzbox_ip'))
-    if os.getenv('fritzbox_port'):
-      self.port = int(os.getenv('fritzbox_port'))
-    self.user = str(os.getenv('fritzbox_user'))
-    self.password = str(os.getenv('fritzbox_password'))
-    if os.getenv('fritzbox_certificate'):
-      self.certificateFile = str(os.getenv('fritzbox_certificate'))
-    if os.getenv('fritzbox_use_tls'):
-      self.useTls = str(os.getenv('fritzbox_use_tls')) == 'true'
+  def __init__(self, target: str = None):
+    self.target = target
+    if self.__getenv('ip'):
+      self.server = str(self.__getenv('ip'))
+    if self.__getenv('port'):
+      self.port = int(self.__getenv('port'))
+    self.user = str(self.__getenv('user'))
+    self.password = str(self.__getenv('password'))
+    if self.__getenv('certificate'):
+      self.certificateFile = str(self.__getenv('certificate'))
+    if self.__getenv('use_tls'):
+      self.useTls = str(self.__getenv('use_tls')) == 'true'
+    if self.__getenv('tr064_port'):
+      self.tr064Port = int(self.__getenv('tr064_port'))
+    if self.__getenv('cache_max_age'):
+      self.cacheMaxAge = int(self.__getenv('cache_max_age'))
+    if self.__getenv('timeout'):
+      self.timeout = float(self.__getenv('timeout'))
+    if self.__getenv('stale_threshold'):
+      self.staleThreshold = float(self.__getenv('stale_threshold'))
+    if self.__getenv('max_staleness'):
+      self.maxStaleness = int(self.__getenv('max_staleness'))
+    if self.__getenv('collector_socket'):
+      self.collectorSocket = str(self.__getenv('collector_socket'))
+    if self.__getenv('collector_interval'):
+      self.collectorInterval = int(self.__getenv('collector_interval'))
+    if self.__getenv('exporter_address'):
+      self.exporterAddress = str(self.__getenv('exporter_address'))
+    if self.__getenv('exporter_port'):
+      self.exporterPort = int(self.__getenv('exporter_port'))
+    if self.__getenv('exporter_interval'):
+      self.exporterInterval = int(self.__getenv('exporter_interval'))
+
+    if target is not None:
+      self.hostName = os.getenv('fritzbox_' + target + '_host_name') or self.server
+      if not os.getenv('fritzbox_' + target + '_collector_socket'):
+        # each box of a fleet has a collector of its own
+        self.collectorSocket = str(os.getenv('MUNIN_PLUGSTATE')) + '/fritzbox/collector.' + target + '.sock'
+
+  def __getenv(self, name: str) -> str:
+    """reads env.fritzbox_<target>_<name> of a box of a fleet, falling back to env.fritzbox_<name>"""
+    if self.target is not None and os.getenv('fritzbox_' + self.target + '_' + name):
+      return os.getenv('fritzbox_' + self.target + '_' + name)
+    return os.getenv('fritzbox_' + name)
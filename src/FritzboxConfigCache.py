@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+  FritzboxConfigCache - reuses the config a plugin printed while the box stays the same
+
+  The config of some plugins takes requests to the box (the DSL warning limits,
+  the maximum WAN bit rates, the external IP addresses, the smart home devices),
+  although it hardly ever changes. The printed config is kept in the plugin state
+  with a fingerprint of what it depends on: the firmware version of the box, the
+  options of the plugin and a value its fetch runs record, e.g. the sync rates or
+  the ids of the smart home devices. As long as the fetch runs record the same
+  fingerprint, the config is printed without asking the box. The firmware
+  version is None unless a TR-064 plugin keeps the descriptions of the box,
+  then only MAX_AGE renews the config after a firmware update.
+"""
+
+import io
+import json
+import time
+import contextlib
+from typing import Callable
+from FritzboxConfig import FritzboxConfig, get_option
+from FritzboxPluginState import FritzboxPluginState
+from FritzboxTR064 import FritzboxTR064
+
+# seconds after which the config is printed from the box again, fingerprint or not
+MAX_AGE = 86400
+
+class FritzboxConfigCache:
+  __state = None
+  __key = None
+  __config = None
+  __loaded = False
+
+  # default constructor
+  def __init__(self, plugin: str, options: list = None, config: FritzboxConfig = None):
+    """
+    :param plugin: the name of the plugin state the config is kept in
+    :param options: the plugin options the config depends on, e.g. ['dsl_modes']
+    """
+    if options is None:
+      options = []
+    if config is None:
+      config = FritzboxConfig()
+    self.__state = FritzboxPluginState(plugin + '_config', config)
+    # the TR-064 plugins keep the firmware version up to date, reading it takes no request
+    self.__key = {'firmware': FritzboxTR064(config).loadFirmwareVersion(), 'options': {name: get_option(name, config) for name in options}}
+
+  def __getKey(self, fingerprint) -> dict:
+    return dict(self.__key, fingerprint=fingerprint)
+
+  def getFingerprint(self):
+    """returns the fingerprint the last fetch recorded, None if there is none yet"""
+    return self.__state.load().get('fingerprint')
+
+  def setFingerprint(self, fingerprint):
+    """records the fingerprint of the fetched values, it must be JSON serializable"""
+    # compare it as it is stored, e.g. tuples are loaded as lists
+    fingerprint = json.loads(json.dumps(fingerprint))
+    state = self.__state.load()
+    if 'fingerprint' not in state or state['fingerprint'] != fingerprint:
+      state['fingerprint'] = fingerprint
+      self.__state.save(state)
+
+  def loadConfig(self) -> str:
+    """returns the kept config if its fingerprint is still the recorded one, else None
+
+    The result is decided once, so a fingerprint recorded later in the same run
+    doesn't discard a config whose requests were already skipped.
+    """
+    if not self.__loaded:
+      state = self.__state.load()
+      if 'config' in state and 0 <= time.time() - state['time'] <= MAX_AGE and state['key'] == self.__getKey(state.get('fingerprint')):
+        self.__config = state['config']
+      self.__loaded = True
+    return self.__config
+
+  def printConfig(self, printConfig: Callable):
+    """prints the kept config, or runs printConfig() and keeps what it printed"""
+    config = self.loadConfig()
+    if config is None:
+      output = io.StringIO()
+      try:
+        with contextlib.redirect_stdout(output):
+          printConfig()
+      except BaseException:
+        # don't swallow what was printed, e.g. the message of a failed login
+        print(output.getvalue(), end='')
+        raise
+      config = output.getvalue()
+      state = self.__state.load()
+      state.update({'key': self.__getKey(state.get('fingerprint')), 'time': time.time(), 'config': config})
+      self.__state.save(state)
+      self.__config = config
+    print(config, end='')
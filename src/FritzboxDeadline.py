@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+  FritzboxDeadline - the time a plugin run may spend waiting for the Fritzbox
+
+  All requests of a run to a box, the login challenge, the login response and
+  the pages (web interface and TR-064 alike), share one deadline. Each box has
+  a deadline of its own, so a box that doesn't answer (e.g. one of several in
+  env.fritzbox_targets) doesn't use up the time of the others. Each request gets the
+  time left as read timeout and at most CONNECT_TIMEOUT of it to connect, so a
+  rebooting box or a dropped link ends the run before munin-node kills it.
+
+  A plugin is one run, starting with its first request. Daemons (collector,
+  exporter) and other long running callers start a new run per collection.
+"""
+
+import time
+import threading
+from FritzboxConfig import FritzboxConfig
+from FritzboxExceptions import FritzboxTimeoutError, FritzboxUnreachableError
+
+# seconds to establish a connection, the box answers within milliseconds if it is reachable at all
+CONNECT_TIMEOUT = 3
+
+# after this many requests in a row couldn't reach the box, the following ones fail right away for SKIP_TIME seconds
+FAILURES_UNTIL_SKIP = 2
+SKIP_TIME = 60
+
+# the deadlines of the current runs per box
+_deadlines = {}
+_lock = threading.Lock()
+
+def get_box(config: FritzboxConfig) -> tuple:
+  """the box a deadline is kept for, the same as the session of FritzboxFileSession"""
+  return (config.server, config.port, config.user)
+
+def start_run(config: FritzboxConfig):
+  """starts a new deadline of env.fritzbox_timeout seconds for the following requests to the box"""
+  with _lock:
+    _deadlines[get_box(config)] = time.monotonic() + config.timeout
+
+def get_timeouts(config: FritzboxConfig) -> tuple:
+  """returns the (connect, read) timeouts of the next request to the box, starting the run on its first request
+
+  :raises FritzboxTimeoutError: if the run has no time left
+  """
+  with _lock:
+    deadline = _deadlines.setdefault(get_box(config), time.monotonic() + config.timeout)
+  remaining = deadline - time.monotonic()
+  if remaining <= 0:
+    raise FritzboxTimeoutError("No time left for requests to the FritzBox within " + str(config.timeout) + " seconds")
+  return (min(CONNECT_TIMEOUT, remaining), remaining)
+
+def check_reachable(session):
+  """raises instead of waiting for a timeout again while the previous requests of any plugin couldn't reach the box"""
+  retryTime = session.loadRetryTime()
+  if retryTime > 0:
+    raise FritzboxUnreachableError("FritzBox unreachable, not trying again for another " + str(retryTime) + " seconds", retryTime)
+
+def count_failure(session):
+  session.countFailure(FAILURES_UNTIL_SKIP, SKIP_TIME)
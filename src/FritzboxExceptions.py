@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+  FritzboxExceptions - the errors raised by FritzboxInterface and FritzboxAsyncInterface
+
+  The sync interface turns them into the exit codes and messages munin expects,
+  callers embedding the interface (e.g. a concurrent collector) can handle them.
+"""
+
+class FritzboxError(Exception):
+  """base of all errors talking to a Fritzbox"""
+
+class FritzboxConnectionError(FritzboxError):
+  """the Fritzbox could not be reached, or the connection or TLS handshake failed"""
+
+class FritzboxTimeoutError(FritzboxConnectionError):
+  """the Fritzbox did not answer within the time left of the run"""
+
+class FritzboxUnreachableError(FritzboxConnectionError):
+  """the requests are skipped for a while, as the previous ones could not reach the Fritzbox either"""
+
+  def __init__(self, message: str, retryTime: int):
+    super().__init__(message)
+    self.retryTime = retryTime
+
+class FritzboxHTTPError(FritzboxError):
+  """the Fritzbox answered with an HTTP error status"""
+
+  def __init__(self, message: str, status: int):
+    super().__init__(message)
+    self.status = status
+
+class FritzboxResponseError(FritzboxError):
+  """the Fritzbox sent a response which could not be parsed, e.g. no JSON"""
+
+class FritzboxLoginError(FritzboxError):
+  """the Fritzbox refused the login, e.g. because of invalid credentials"""
+
+class FritzboxLoginBlockedError(FritzboxLoginError):
+  """the Fritzbox blocks logins for blockTime seconds after failed attempts"""
+
+  def __init__(self, message: str, blockTime: int):
+    super().__init__(message)
+    self.blockTime = blockTime
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+  FritzboxExporter - an optional Prometheus exporter for the fritzbox_* plugins
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Serves the values of the plugins listed in env.all_plugins on /metrics in the
+  Prometheus text format. The pages are fetched and parsed by the plugins
+  themselves (as in fritzbox_all), and the munin fields they print are exported
+  as fritzbox_<graph>_<field>, as counter for DERIVE and COUNTER fields and as
+  gauge otherwise. The exporter keeps one session and collects at most once per
+  interval, any number of scrapers within the interval get the same collection.
+  As it shares the response cache with the munin plugins, scraping the box from
+  munin and from Prometheus loads it only once as well.
+
+  Start it with the same environment as the munin plugins, e.g. from a systemd unit:
+
+  MUNIN_PLUGSTATE=/var/lib/munin-node/plugin-state/nobody \
+  fritzbox_ip=... fritzbox_user=... fritzbox_password=... all_plugins='dsl ecostat' \
+  python3 /usr/share/munin/plugins/FritzboxExporter.py
+
+  env.fritzbox_exporter_address [address to listen on, optional]
+  env.fritzbox_exporter_port [port to listen on, optional]
+  env.fritzbox_exporter_interval [seconds to serve the same collection, optional]
+"""
+
+import io
+import re
+import sys
+import time
+import signal
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from FritzboxDeadline import start_run
+from FritzboxScrapeStats import flush_all
+from fritzbox_all import create_plugin, get_plugins, print_all, retrieve_all
+
+# the labels and types of the fields are collected again after this many seconds
+CONFIG_INTERVAL = 3600
+COUNTER_TYPES = ['DERIVE', 'COUNTER']
+
+def get_metric_name(graph: str, field: str) -> str:
+  return 'fritzbox_' + re.sub('[^A-Za-z0-9_]', '_', graph + '_' + field)
+
+def parse_munin_output(output: str) -> dict:
+  """returns the attributes of the graphs and fields a plugin printed, as {graph: {'graph': {attribute: value}, 'fields': {field: {attribute: value}}}}"""
+  graphs = {}
+  graph = None
+  for line in output.splitlines():
+    if line.startswith('multigraph '):
+      graph = graphs.setdefault(line[len('multigraph '):].strip(), {'graph': {}, 'fields': {}})
+      continue
+    key, _, value = line.partition(' ')
+    if graph is None:
+      continue
+    if key.startswith('graph_'):
+      graph['graph'][key] = value
+    elif '.' in key:
+      field, _, attribute = key.partition('.')
+      graph['fields'].setdefault(field, {})[attribute] = value
+  return graphs
+
+def format_metrics(configs: dict, values: dict) -> str:
+  """renders the fields of all graphs having a value in the Prometheus text format"""
+  lines = []
+  for graph, fields in sorted(values.items()):
+    config = configs.get(graph, {'graph': {}, 'fields': {}})
+    for field, attributes in fields['fields'].items():
+      # values are printed as "value" or with the time of the measurement as "epoch:value"
+      value = attributes.get('value', 'U').rsplit(':', 1)[-1]
+      if value == 'U':
+        continue
+      fieldConfig = config['fields'].get(field, {})
+      name = get_metric_name(graph, field)
+      title = config['graph'].get('graph_title', graph)
+      lines.append('# HELP ' + name + ' ' + title + ': ' + fieldConfig.get('label', field))
+      lines.append('# TYPE ' + name + ' ' + ('counter' if fieldConfig.get('type') in COUNTER_TYPES else 'gauge'))
+      lines.append(name + ' ' + value)
+  return '\n'.join(lines) + '\n'
+
+class FritzboxExporter:
+  config = None
+  __interface = None
+
+  # default constructor
+  def __init__(self):
+    from FritzboxInterface import FritzboxInterface
+    self.__interface = FritzboxInterface(useCollector=False)
+    self.config = self.__interface.config
+    # Prometheus takes no past samples, and the exporter mustn't take the missed samples from the munin plugins
+    self.__plugins = [create_plugin(name, self.config, False) for name in get_plugins(self.config)]
+    self.__lock = threading.Lock()
+    self.__configs = {}
+    self.__configured = set()
+    self.__configTime = 0
+    self.__metrics = None
+    self.__metricsTime = 0
+
+  def __capture(self, plugin, results: dict, printer: str) -> tuple:
+    """runs a print function of a plugin and parses what it printed"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+      failed = print_all([plugin], results, printer)
+    return (parse_munin_output(output.getvalue()), not failed)
+
+  def collect(self) -> str:
+    """returns the metrics, collected at most once per interval"""
+    with self.__lock:
+      if self.__metrics is not None and time.time() - self.__metricsTime < self.config.exporterInterval:
+        return self.__metrics
+
+      start = time.time()
+      if start - self.__configTime > CONFIG_INTERVAL:
+        self.__configured.clear()
+        self.__configTime = start
+      # plugins which failed before are asked for their config again, else their fields lack labels and types
+      withConfig = len(self.__configured) < len(self.__plugins)
+      start_run(self.config)
+      results = retrieve_all(self.__plugins, self.__interface, withConfig, True)
+      flush_all()
+
+      values = {}
+      up = []
+      for plugin in self.__plugins:
+        if withConfig and plugin.name not in self.__configured:
+          graphs, ok = self.__capture(plugin, results, 'printConfig')
+          self.__configs.update(graphs)
+          if ok:
+            self.__configured.add(plugin.name)
+        graphs, ok = self.__capture(plugin, results, 'printValues')
+        values.update(graphs)
+        up.append('fritzbox_plugin_up{plugin="' + plugin.name + '"} ' + str(int(ok)))
+
+      self.__metrics = (format_metrics(self.__configs, values) +
+                        '# HELP fritzbox_plugin_up Whether the last collection of a plugin succeeded\n'
+                        '# TYPE fritzbox_plugin_up gauge\n' + '\n'.join(up) + '\n'
+                        '# HELP fritzbox_collect_seconds Duration of the last collection\n'
+                        '# TYPE fritzbox_collect_seconds gauge\n'
+                        'fritzbox_collect_seconds ' + str(round(time.time() - start, 3)) + '\n')
+      self.__metricsTime = start
+      return self.__metrics
+
+  def serve(self):
+    server = ThreadingHTTPServer((self.config.exporterAddress, self.config.exporterPort), FritzboxExporterHandler)
+    server.daemon_threads = True
+    server.exporter = self
+    try:
+      server.serve_forever()
+    finally:
+      server.server_close()
+
+class FritzboxExporterHandler(BaseHTTPRequestHandler):
+  def do_GET(self):
+    if self.path.split('?', 1)[0] != '/metrics':
+      self.send_error(404)
+      return
+
+    body = self.server.exporter.collect().encode()
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    pass
+
+if __name__ == "__main__":
+  signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+  try:
+    FritzboxExporter().serve()
+  except KeyboardInterrupt:
+    pass
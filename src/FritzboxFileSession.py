@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
 import os
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
 
 class FritzboxFileSession:
   __separator = "__"
@@ -20,8 +24,11 @@ class FritzboxFileSession:
   def getSessionDir(self) -> str:
     return os.getenv('MUNIN_PLUGSTATE') + '/fritzbox'
 
+  def getSessionName(self) -> str:
+    return self.__server + self.__separator + str(self.__port) + self.__separator + self.__user
+
   def __getSessionFilename(self) -> str:
-    return self.__server + self.__separator + str(self.__port) + self.__separator + self.__user + '.sid'
+    return self.getSessionName() + '.sid'
 
   def saveSessionId(self, session_id):
     statedir = self.getSessionDir()
@@ -31,8 +38,12 @@ class FritzboxFileSession:
 
     statefilename = statedir + '/' + self.__getSessionFilename()
 
-    with open(statefilename, 'w') as statefile:
+    # replace the file atomically, so parallel plugins never read a partial session id
+    tmpfilename = statefilename + '.' + str(os.getpid())
+    with open(tmpfilename, 'w') as statefile:
       statefile.write(session_id)
+    os.replace(tmpfilename, statefilename)
+    self.touchSession()
 
   def loadSessionId(self) -> str:
     statefilename = self.getSessionDir() + '/' + self.__getSessionFilename()
@@ -43,5 +54,136 @@ class FritzboxFileSession:
       session_id = statefile.readline()
       return session_id
 
+  @contextmanager
+  def lock(self, name: str = 'lock'):
+    """holds an exclusive advisory lock on the session, so only one process at a time logs in
+
+    :param name: the lock file extension, state updated while the login lock is held takes a lock of its own
+    """
+    statedir = self.getSessionDir()
+
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+
+    with open(statedir + '/' + self.getSessionName() + '.' + name, 'w') as lockfile:
+      fcntl.flock(lockfile, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+  def saveBlockTime(self, block_time: int):
+    """remembers until when the Fritzbox refuses further logins"""
+    statedir = self.getSessionDir()
+
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+
+    with open(statedir + '/' + self.getSessionName() + '.block', 'w') as statefile:
+      statefile.write(str(time.time() + block_time))
+
+  def loadBlockTime(self) -> int:
+    """returns the remaining seconds until the next login may be attempted"""
+    statefilename = self.getSessionDir() + '/' + self.getSessionName() + '.block'
+    try:
+      with open(statefilename, 'r') as statefile:
+        return max(0, int(float(statefile.readline()) - time.time() + 0.5))
+    except (OSError, ValueError):
+      return 0
+
+  def countFailure(self, threshold: int, retryTime: int):
+    """counts a request which couldn't reach the Fritzbox, after threshold failures in a row the following requests are skipped for retryTime seconds"""
+    statefilename = self.getSessionDir() + '/' + self.getSessionName() + '.down'
+    try:
+      # the requests of concurrent plugins and threads fail together, count each of them
+      with self.lock('down.lock'):
+        failures = self.__loadFailures()[0] + 1
+        until = time.time() + retryTime if failures >= threshold else 0
+        tmpfilename = statefilename + '.' + str(os.getpid()) + '.' + str(threading.get_ident())
+        with open(tmpfilename, 'w') as statefile:
+          statefile.write(str(failures) + ' ' + str(until))
+        os.replace(tmpfilename, statefilename)
+    except OSError:
+      pass
+
+  def clearFailures(self):
+    """forgets the failed requests after one reached the Fritzbox"""
+    statefilename = self.getSessionDir() + '/' + self.getSessionName() + '.down'
+    # called after every request, which hardly ever follows a failure
+    if not os.path.exists(statefilename):
+      return
+    try:
+      with self.lock('down.lock'):
+        os.remove(statefilename)
+    except OSError:
+      pass
+
+  def loadRetryTime(self) -> int:
+    """returns the remaining seconds requests are skipped for, as the Fritzbox was unreachable"""
+    return max(0, int(self.__loadFailures()[1] - time.time() + 0.5))
+
+  def __loadFailures(self) -> tuple:
+    try:
+      with open(self.getSessionDir() + '/' + self.getSessionName() + '.down', 'r') as statefile:
+        failures, until = statefile.readline().split()
+        return (int(failures), float(until))
+    except (OSError, ValueError):
+      return (0, 0.0)
+
+  def saveStaticHash(self, key: str, static_hash: bytes):
+    """stores the static-salt PBKDF2 stage of the login, readable by the munin user only"""
+    statedir = self.getSessionDir()
+
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+
+    statefilename = statedir + '/' + self.getSessionName() + '.pbkdf2'
+    tmpfilename = statefilename + '.' + str(os.getpid())
+    fd = os.open(tmpfilename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as statefile:
+      statefile.write(key + '\n' + static_hash.hex())
+    os.replace(tmpfilename, statefilename)
+
+  def loadStaticHash(self, key: str) -> bytes:
+    """returns the stored static-salt PBKDF2 stage, or None if it was stored for another key"""
+    statefilename = self.getSessionDir() + '/' + self.getSessionName() + '.pbkdf2'
+    if not os.path.exists(statefilename):
+      return None
+
+    with open(statefilename, 'r') as statefile:
+      lines = statefile.read().split('\n')
+      if len(lines) != 2 or lines[0] != key:
+        return None
+      return bytes.fromhex(lines[1])
+
+  def clearStaticHash(self):
+    try:
+      os.remove(self.getSessionDir() + '/' + self.getSessionName() + '.pbkdf2')
+    except OSError:
+      pass
+
+  def touchSession(self):
+    """remembers the last use of the session id, the Fritzbox expires sessions when they are idle"""
+    statedir = self.getSessionDir()
+
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+
+    # replace the file atomically like the session id, so parallel plugins never read a partial time
+    statefilename = statedir + '/' + self.getSessionName() + '.used'
+    tmpfilename = statefilename + '.' + str(os.getpid()) + '.' + str(threading.get_ident())
+    with open(tmpfilename, 'w') as statefile:
+      statefile.write(str(time.time()))
+    os.replace(tmpfilename, statefilename)
+
+  def loadLastUse(self) -> float:
+    """returns the timestamp of the last use of the session id, or None if it is unknown"""
+    statefilename = self.getSessionDir() + '/' + self.getSessionName() + '.used'
+    try:
+      with open(statefilename, 'r') as statefile:
+        return float(statefile.readline())
+    except (OSError, ValueError):
+      return None
+
   def clearSession(self):
     os.remove(self.getSessionDir() + '/' + self.__getSessionFilename())
\ No newline at end of file
@@ -15,6 +15,9 @@
   env.fritzbox_password [fritzbox password]
   env.fritzbox_user [fritzbox user, set any value if not required]
   env.fritzbox_use_tls [true or false, optional]
+  env.fritzbox_tr064_port [port of the TR-064 interface, optional]
+  env.fritzbox_cache_max_age [seconds to reuse cached responses, 0 to disable, optional]
+  env.fritzbox_timeout [seconds a plugin run may wait for the fritzbox, optional]
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -27,25 +30,65 @@
 
 import hashlib
 import sys
-import json
+import time
+import threading
 
-import requests
-from lxml import etree
+import xml.etree.ElementTree as ElementTree
 from typing import Callable
 from json.decoder import JSONDecodeError
 from FritzboxConfig import FritzboxConfig
+from FritzboxExceptions import FritzboxError, FritzboxConnectionError, FritzboxTimeoutError, FritzboxHTTPError, FritzboxResponseError, FritzboxLoginError, FritzboxLoginBlockedError
+from FritzboxDeadline import check_reachable, count_failure, get_timeouts
 from FritzboxFileSession import FritzboxFileSession
+from FritzboxJson import extract, loads
+from FritzboxResponseCache import FritzboxResponseCache
+from FritzboxCollectorClient import FritzboxCollectorClient
+from FritzboxScrapeStats import FritzboxScrapeStats, get_endpoint
+from FritzboxTR064 import FritzboxTR064
+
+# the Fritzbox expires sessions after 20 minutes without a request
+SESSION_TIMEOUT = 1200
+# renew sessions this many seconds before they would expire
+SESSION_TIMEOUT_MARGIN = 60
 
 class FritzboxInterface:
   config = None
   __session = None
+  __cache = None
+  __collector = None
+  __stats = None
+  __http = None
+  __tr064 = None
   __baseUri = ""
 
   # default constructor
-  def __init__(self):
-    self.config = FritzboxConfig()
+  def __init__(self, useCollector: bool = True, config: FritzboxConfig = None):
+    self.config = config if config is not None else FritzboxConfig()
     self.__session = FritzboxFileSession(self.config.server, self.config.user, self.config.port)
+    self.__cache = FritzboxResponseCache(self.__session.getSessionDir() + '/' + self.__session.getSessionName())
+    self.__stats = FritzboxScrapeStats(self.__session.getSessionDir() + '/' + self.__session.getSessionName())
+    # only connects with the first call, plugins without TR-064 don't pay for it
+    self.__tr064 = FritzboxTR064(self.config)
+    if useCollector:
+      self.__collector = FritzboxCollectorClient(self.config.collectorSocket, self.__session.getSessionName())
     self.__baseUri = self.__getBaseUri()
+    self.__loginLock = threading.Lock()
+
+  def __getHttp(self):
+    """Creates one pooled HTTP session per box, so the login challenge, the login response and all
+    page requests reuse a single keep-alive connection (and TLS handshake) instead of opening a new one each.
+    requests is only imported here, runs served from the cache or the collector don't pay for it.
+    """
+    if self.__http is None:
+      import requests
+      http = requests.Session()
+      adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=8)
+      http.mount('http://', adapter)
+      http.mount('https://', adapter)
+      http.headers.update({"Connection": "keep-alive"})
+      self.__stats.instrument(http)
+      self.__http = http
+    return self.__http
 
   def __getBaseUri(self) -> str:
     DEFAULT_PORTS = (80, 443)
@@ -55,21 +98,162 @@ class FritzboxInterface:
     else:
       return '{}://{}'.format(SCHEMES[self.config.useTls], self.config.server)
 
-  def getPageWithLogin(self, page: str, data={}) -> str:
-    return self.__callPageWithLogin(self.__get, page, data)
+  def getTR064(self) -> FritzboxTR064:
+    """returns the TR-064 client of the box, the plugins polling it share its descriptions and connection"""
+    return self.__tr064
+
+  def getScrapeStats(self) -> dict:
+    """returns the timings and counters of the requests to the Fritzbox, see FritzboxScrapeStats"""
+    self.__stats.flush()
+    return self.__stats.load()
+
+  def __request(self, endpoint: str, method: str, url: str, **kwargs):
+    """sends a request over the pooled session and records its timings, HTTP errors are raised after recording"""
+    import requests
+
+    check_reachable(self.__session)
+    timeouts = get_timeouts(self.config)
+    self.__stats.begin()
+    try:
+      r = self.__getHttp().request(method, url, verify=self.config.certificateFile, timeout=timeouts, **kwargs)
+    except requests.exceptions.Timeout as e:
+      self.__stats.end(endpoint)
+      count_failure(self.__session)
+      raise FritzboxTimeoutError(str(e)) from e
+    except requests.exceptions.RequestException as e:
+      self.__stats.end(endpoint)
+      count_failure(self.__session)
+      raise FritzboxConnectionError(str(e)) from e
+    self.__stats.end(endpoint, r)
+    self.__session.clearFailures()
+    try:
+      r.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+      raise FritzboxHTTPError(str(e), r.status_code) from e
+    return r
+
+  @staticmethod
+  def __exitOnError(request: Callable, *args):
+    """runs a request, exiting with the messages and codes the plugins always had instead of raising"""
+    try:
+      return request(*args)
+    except FritzboxLoginBlockedError as e:
+      print("ERROR: " + str(e))
+      sys.exit(1)
+    except FritzboxLoginError as e:
+      # further attempts with the same credentials are pointless, don't make munin retry
+      print("ERROR: " + str(e))
+      sys.exit(0)
+    except FritzboxError as e:
+      sys.exit("ERROR: " + str(e))
+
+  def getPageWithLogin(self, page: str, data={}, maxAge: int = None) -> bytes:
+    """Fetches a page, reusing a cached response if it is younger than maxAge seconds, exits on errors
+
+    :param maxAge: overrides the configured fritzbox_cache_max_age, 0 disables the cache
+    """
+    return self.__exitOnError(self.requestPage, 'GET', page, data, maxAge)
+
+  def postPageWithLogin(self, page: str, data={}, maxAge: int = None, paths: list = None, direct: bool = False):
+    """Posts to a JSON page, reusing a cached response if it is younger than maxAge seconds, exits on errors
+
+    :param maxAge: overrides the configured fritzbox_cache_max_age, 0 disables the cache
+    :param paths: the key paths to return, e.g. [('data', 'drain')], the whole page if None
+    :param direct: fetch the page from the Fritzbox itself, bypassing cache and collector
+    :return: the parsed JSON
+    """
+    return self.__exitOnError(self.requestJson, page, data, maxAge, paths, direct)
+
+  def fetchPage(self, method: str, page: str, data={}) -> bytes:
+    """Fetches a page directly from the Fritzbox, bypassing cache and collector, exits on errors
+
+    :param method: 'GET' or 'POST'
+    :return: the raw content of the page
+    """
+    return self.__exitOnError(self.requestPageFromBox, method, page, data)
+
+  def __loadCached(self, method: str, page: str, data: dict, maxAge: int):
+    """returns the cached response if it is younger than maxAge seconds, else None, and counts the hit or miss"""
+    content = self.__cache.load(method, page, data, maxAge)
+    if maxAge:
+      self.__stats.count('cache_hits' if content is not None else 'cache_misses')
+    return content
+
+  def requestPage(self, method: str, page: str, data={}, maxAge: int = None) -> bytes:
+    """Fetches a page, reusing a cached response if it is younger than maxAge seconds
+
+    :param maxAge: overrides the configured fritzbox_cache_max_age, 0 disables the cache
+    :raises FritzboxError: if the page could not be fetched
+    """
+    if maxAge is None:
+      maxAge = self.config.cacheMaxAge
+
+    content = self.__loadCached(method, page, data, maxAge)
+    if content is None:
+      content = self.__fetch(method, page, data)
+      if maxAge:
+        self.__cache.save(method, page, data, content)
+
+    return content
 
-  def postPageWithLogin(self, page: str, data={}) -> str:
-    data = self.__callPageWithLogin(self.__post, page, data)
+  def requestJson(self, page: str, data={}, maxAge: int = None, paths: list = None, direct: bool = False):
+    """Posts to a JSON page, reusing a cached response if it is younger than maxAge seconds
+
+    :param maxAge: overrides the configured fritzbox_cache_max_age, 0 disables the cache
+    :param paths: the key paths to return, e.g. [('data', 'drain')], the whole page if None (see FritzboxJson)
+    :param direct: fetch the page from the Fritzbox itself, bypassing cache and collector, e.g. if the
+      age of its samples is derived from the time of the request
+    :raises FritzboxError: if the page could not be fetched or is no JSON
+    """
+    if direct:
+      maxAge = 0
+    elif maxAge is None:
+      maxAge = self.config.cacheMaxAge
+
+    content = self.__loadCached('POST', page, data, maxAge)
+    cached = content is not None
+    if not cached:
+      content = self.requestPageFromBox('POST', page, data) if direct else self.__fetch('POST', page, data)
 
     try:
-      jsonData = json.loads(data)
+      start = time.perf_counter()
+      jsonData = loads(content) if paths is None else extract(content, paths)
+      self.__stats.add(get_endpoint(page, data), {'parses': 1, 'parse': time.perf_counter() - start})
     except JSONDecodeError as e:
       # Perhaps session expired, let's clear the session and try again
       self.__session.clearSession()
-      sys.exit('ERROR: Did not receive valid JSON data from FritzBox, so automatically cleared the session, please try again.: ' + str(e))
+      raise FritzboxResponseError('Did not receive valid JSON data from FritzBox, so automatically cleared the session, please try again.: ' + str(e)) from e
+
+    # only cache valid responses
+    if not cached and maxAge:
+      self.__cache.save('POST', page, data, content)
 
     return jsonData
 
+  def __fetch(self, method: str, page: str, data: dict) -> bytes:
+    """asks the collector daemon for the page first and only scrapes the Fritzbox if it is not running,
+    waiting for the collector counts against the deadline of the run
+    """
+    if self.__collector is not None:
+      content = self.__collector.request(method, page, data, get_timeouts(self.config)[1])
+      if content is not None:
+        return content
+
+    return self.requestPageFromBox(method, page, data)
+
+  def requestPageFromBox(self, method: str, page: str, data={}) -> bytes:
+    """Fetches a page directly from the Fritzbox, bypassing cache and collector
+
+    :param method: 'GET' or 'POST'
+    :return: the raw content of the page
+    :raises FritzboxError: if the page could not be fetched
+    """
+    # the session id is added to the parameters, don't change the caller's
+    data = dict(data)
+    if method == 'POST':
+      return self.__callPageWithLogin(self.__post, page, data)
+    return self.__callPageWithLogin(self.__get, page, data)
+
   # Code from https://avm.de/fileadmin/user_upload/Global/Service/Schnittstellen/AVM_Technical_Note_-_Session_ID_deutsch_2021-05-03.pdf
   def __calculate_pbkdf2_response(self, challenge) -> str:
     """ Calculate the response for a given challenge via PBKDF2 """
@@ -80,8 +264,14 @@ class FritzboxInterface:
     iter2 = int(challenge_parts[3])
     salt2 = bytes.fromhex(challenge_parts[4])
     # Hash twice, once with static salt...
+    # (which only changes with the password, so it is computed once and kept in the plugin state,
+    # keyed by salt and iterations only, a fast hash of the password on disk would spare an attacker the PBKDF2)
+    key = challenge_parts[1] + '$' + challenge_parts[2]
+    hash1 = self.__session.loadStaticHash(key)
+    if hash1 is None:
+      hash1 = hashlib.pbkdf2_hmac("sha256", self.config.password.encode(), salt1, iter1)
+      self.__session.saveStaticHash(key, hash1)
     # Once with dynamic salt.
-    hash1 = hashlib.pbkdf2_hmac("sha256", self.config.password.encode(), salt1, iter1)
     hash2 = hashlib.pbkdf2_hmac("sha256", hash1, salt2, iter2)
     return f"{challenge_parts[4]}${hash2.hex()}"
 
@@ -103,22 +293,17 @@ class FritzboxInterface:
 
     :return: the session id
     """
-
     headers = {"Accept": "application/xml", "Content-Type": "text/plain"}
 
     url = '{}/login_sid.lua?version=2'.format(self.__baseUri)
-    try:
-      r = requests.get(url, headers=headers, verify=self.config.certificateFile)
-      r.raise_for_status()
-    except (requests.exceptions.HTTPError, requests.exceptions.SSLError) as err:
-      print(err)
-      sys.exit(1)
+    r = self.__request('login_sid.lua', 'GET', url, headers=headers)
 
     params = {}
-    root = etree.fromstring(r.content)
-    session_id = root.xpath('//SessionInfo/SID/text()')[0]
+    root = self.__parseLoginResponse(r.content)
+    session_id = root.findtext('SID')
     if session_id == "0000000000000000":
-      challenge = root.xpath('//SessionInfo/Challenge/text()')[0]
+      self.__checkBlockTime(root)
+      challenge = root.findtext('Challenge')
       if challenge.startswith("2$"): # we received a PBKDF2 challenge
         response_bf = self.__calculate_pbkdf2_response(challenge)
       else: # or fall back to MD5
@@ -132,38 +317,106 @@ class FritzboxInterface:
     headers = {"Accept": "text/html,application/xhtml+xml,application/xml", "Content-Type": "application/x-www-form-urlencoded"}
 
     url = '{}/login_sid.lua'.format(self.__baseUri)
-    try:
-      r = requests.get(url, headers=headers, params=params, verify=self.config.certificateFile)
-      r.raise_for_status()
-    except (requests.exceptions.HTTPError, requests.exceptions.SSLError) as err:
-      print(err)
-      sys.exit(1)
+    r = self.__request('login_sid.lua', 'GET', url, headers=headers, params=params)
 
-    root = etree.fromstring(r.content)
-    session_id = root.xpath('//SessionInfo/SID/text()')[0]
+    root = self.__parseLoginResponse(r.content)
+    session_id = root.findtext('SID')
     if session_id == "0000000000000000":
-      print("ERROR: No SID received because of invalid credentials")
-      sys.exit(0)
+      # the stored static hash may stem from a wrong password, which doesn't change the salt
+      self.__session.clearStaticHash()
+      # the failed login makes the Fritzbox block further attempts, don't let the other plugins retry before,
+      # but report the invalid credentials, the block is only their consequence
+      block_time = self.__saveBlockTime(root)
+      message = "No SID received because of invalid credentials"
+      if block_time > 0:
+        message += ", further logins blocked by the FritzBox for " + str(block_time) + " seconds"
+      raise FritzboxLoginError(message)
 
     self.__session.saveSessionId(session_id)
+    self.__stats.count('logins')
 
     return session_id
 
+  @staticmethod
+  def __parseLoginResponse(content: bytes):
+    try:
+      return ElementTree.fromstring(content)
+    except ElementTree.ParseError as e:
+      raise FritzboxResponseError("Invalid login_sid.lua response: " + str(e)) from e
+
+  def __saveBlockTime(self, root) -> int:
+    """persists the BlockTime of a login_sid.lua response and returns it"""
+    try:
+      block_time = int(root.findtext('BlockTime') or 0)
+    except ValueError:
+      return 0
+    if block_time > 0:
+      self.__session.saveBlockTime(block_time)
+    return block_time
+
+  def __checkBlockTime(self, root):
+    """persists the BlockTime of a login_sid.lua response and raises while logins are blocked"""
+    block_time = self.__saveBlockTime(root)
+    if block_time > 0:
+      raise FritzboxLoginBlockedError("Login blocked by the FritzBox for " + str(block_time) + " seconds", block_time)
+
+  def __renewSessionId(self, stale_session_id) -> str:
+    """Logs in again, unless another thread or plugin already replaced the stale session id"""
+    with self.__loginLock, self.__session.lock():
+      session_id = self.__session.loadSessionId()
+      if session_id != None and session_id != stale_session_id:
+        return session_id
+
+      block_time = self.__session.loadBlockTime()
+      if block_time > 0:
+        raise FritzboxLoginBlockedError("Login blocked by the FritzBox for another " + str(block_time) + " seconds", block_time)
+
+      return self.__getSessionId()
+
+  def __probeSessionId(self, session_id) -> bool:
+    """Asks the Fritzbox whether a session id is still valid, which is cheaper than a failing page request"""
+    headers = {"Accept": "application/xml", "Content-Type": "text/plain"}
+
+    url = '{}/login_sid.lua'.format(self.__baseUri)
+    try:
+      self.__stats.count('probes')
+      r = self.__request('login_sid.lua', 'GET', url, headers=headers, params={'version': 2, 'sid': session_id})
+      root = ElementTree.fromstring(r.content)
+      return root.findtext('SID') == session_id
+    except (FritzboxError, ElementTree.ParseError):
+      return False
+
+  def __isSessionUsable(self, session_id) -> bool:
+    """Checks the idle time of a session id before using it"""
+    last_use = self.__session.loadLastUse()
+    if last_use is None or last_use > time.time():
+      # the age is unknown (e.g. the session was stored by an older version, or the clock changed)
+      return self.__probeSessionId(session_id)
+
+    return time.time() - last_use < SESSION_TIMEOUT - SESSION_TIMEOUT_MARGIN
+
   def __callPageWithLogin(self, method: Callable[[], str], page, data={}) -> str:
     session_id = self.__session.loadSessionId()
 
+    if session_id != None and not self.__isSessionUsable(session_id):
+      # renew sessions close to their expiry right away instead of finding out by a failed request
+      session_id = self.__renewSessionId(session_id)
+
     if session_id != None:
       try:
-        return method(session_id, page, data)
-      except (requests.exceptions.HTTPError,
-             requests.exceptions.SSLError) as e:
-        code = e.response.status_code
-        if code != 403:
-          print(e)
-          sys.exit(1)
-
-    session_id = self.__getSessionId()
-    return method(session_id, page, data)
+        content = method(session_id, page, data)
+        self.__session.touchSession()
+        return content
+      except FritzboxHTTPError as e:
+        if e.status != 403:
+          raise
+        # the session expired early (e.g. the box rebooted), log in again and retry once
+        self.__stats.add(get_endpoint(page, data), {'retries': 1})
+
+    session_id = self.__renewSessionId(session_id)
+    content = method(session_id, page, data)
+    self.__session.touchSession()
+    return content
 
   def __post(self, session_id, page, data={}) -> str:
     """Sends a POST request to the Fritzbox and returns the response
@@ -180,8 +433,7 @@ class FritzboxInterface:
 
     url = '{}/{}'.format(self.__baseUri, page)
 
-    r = requests.post(url, headers=headers, data=data, verify=self.config.certificateFile)
-    r.raise_for_status()
+    r = self.__request(get_endpoint(page, data), 'POST', url, headers=headers, data=data)
 
     return r.content
 
@@ -200,7 +452,6 @@ class FritzboxInterface:
     params["sid"] = session_id
     url = '{}/{}'.format(self.__baseUri, page)
 
-    r = requests.get(url, headers=headers, params=params, verify=self.config.certificateFile)
-    r.raise_for_status()
+    r = self.__request(get_endpoint(page, data), 'GET', url, headers=headers, params=params)
 
     return r.content
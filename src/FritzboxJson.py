@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+  FritzboxJson - parses the data.lua JSON pages, or only the parts a plugin reads
+
+  The pages carry much more than a plugin prints, e.g. the whole scan list or the
+  24h series of every graph. extract() returns only the values at the key paths a
+  plugin asks for, nested as in the page, so that only these are kept (e.g. as
+  the last result of FritzboxRevalidate):
+
+    extract(content, [('data', 'cpuutil'), ('data', 'cputemp')])
+    => {'data': {'cpuutil': {...}, 'cputemp': {...}}}
+
+  The page is decoded as a whole, with orjson if it is installed. A path through
+  something else than objects is left out like a missing key.
+"""
+
+import json
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+def get_wanted(paths: list) -> dict:
+  """turns key paths into a tree of keys, None marking the values to keep"""
+  wanted = {}
+  for path in paths:
+    node = wanted
+    for key in path[:-1]:
+      if node.get(key, {}) is None:
+        break # an enclosing value is kept as a whole
+      node = node.setdefault(key, {})
+    else:
+      node[path[-1]] = None
+  return wanted
+
+def select(node: dict, wanted: dict) -> dict:
+  """returns the wanted members of a decoded object, leaving out paths through something else than objects"""
+  selected = {}
+  for key, members in wanted.items():
+    if key not in node:
+      continue
+    if members is None:
+      selected[key] = node[key]
+    elif isinstance(node[key], dict):
+      selected[key] = select(node[key], members)
+  return selected
+
+def loads(content):
+  """decodes a whole page, with orjson if it is installed"""
+  return orjson.loads(content) if orjson is not None else json.loads(content)
+
+def extract(content, paths: list) -> dict:
+  """Returns only the values at the key paths of the JSON object in content, nested like in content
+
+  :param paths: tuples of keys, e.g. [('data', 'drain')]
+  :raises json.JSONDecodeError: if content is no JSON object
+  """
+  result = loads(content)
+  if not isinstance(result, dict):
+    raise json.JSONDecodeError("Expecting object", str(content[:64]), 0)
+  return select(result, get_wanted(paths))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import fcntl
+from contextlib import contextmanager
+from FritzboxConfig import FritzboxConfig
+from FritzboxFileSession import FritzboxFileSession
+
+class FritzboxPluginState:
+  """State a plugin keeps between its runs (e.g. counters), stored as JSON next to the session of its Fritzbox"""
+  __stateFile = ""
+
+  # default constructor
+  def __init__(self, plugin: str, config: FritzboxConfig = None):
+    if config is None:
+      config = FritzboxConfig()
+    session = FritzboxFileSession(config.server, config.user, config.port)
+    self.__stateFile = session.getSessionDir() + '/' + session.getSessionName() + '.' + plugin + '.json'
+
+  def getFilename(self, extension: str = 'json') -> str:
+    """returns the file of the state, or of another file kept next to it, e.g. a lock"""
+    return self.__stateFile[:-len('json')] + extension
+
+  @contextmanager
+  def lock(self):
+    """holds an exclusive advisory lock on the state, so concurrent runs don't lose each other's updates"""
+    os.makedirs(os.path.dirname(self.__stateFile), exist_ok=True)
+    with open(self.getFilename('lock'), 'w') as lockfile:
+      fcntl.flock(lockfile, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+  def load(self) -> dict:
+    """returns the saved state, an empty one if there is none yet or it is unreadable"""
+    try:
+      with open(self.__stateFile, 'r') as statefile:
+        state = json.load(statefile)
+    except (OSError, ValueError):
+      return {}
+    return state if isinstance(state, dict) else {}
+
+  def save(self, state: dict):
+    statedir = os.path.dirname(self.__stateFile)
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+
+    # replace the file atomically, so a concurrent run never reads a partial state
+    tmpfilename = self.__stateFile + '.' + str(os.getpid())
+    with open(tmpfilename, 'w') as statefile:
+      json.dump(state, statefile)
+    os.replace(tmpfilename, self.__stateFile)
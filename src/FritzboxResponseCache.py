@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+class FritzboxResponseCache:
+  """TTL cache for Fritzbox page responses shared by all plugins of one munin-node.
+
+  Responses are stored as one file per page and normalized parameters in the
+  plugin state directory, so that a `config` and `fetch` run (or several plugins
+  requesting the same page) within one munin cycle only hit the box once.
+  """
+  __cacheDir = ""
+
+  # default constructor
+  def __init__(self, stateDir: str):
+    self.__cacheDir = stateDir + '/cache'
+
+  @staticmethod
+  def normalizeParams(data: dict) -> str:
+    """returns a canonical representation of the request parameters, ignoring the session id"""
+    params = {}
+    for k, v in data.items():
+      if k == 'sid':
+        continue
+      params[str(k)] = '' if v is None else str(v)
+    return json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+  def __getCacheFilename(self, method: str, page: str, data: dict) -> str:
+    key = method + ' ' + page + '?' + self.normalizeParams(data)
+    return self.__cacheDir + '/' + hashlib.sha256(key.encode()).hexdigest() + '.cache'
+
+  def load(self, method: str, page: str, data: dict, maxAge: int):
+    """returns the cached response if it is younger than maxAge seconds, else None"""
+    if not maxAge or maxAge <= 0:
+      return None
+
+    filename = self.__getCacheFilename(method, page, data)
+    try:
+      age = time.time() - os.path.getmtime(filename)
+      if age < 0 or age > maxAge:
+        return None
+      with open(filename, 'rb') as cachefile:
+        return cachefile.read()
+    except OSError:
+      return None
+
+  def save(self, method: str, page: str, data: dict, content: bytes):
+    # the threads of fritzbox_all may create it concurrently
+    os.makedirs(self.__cacheDir, exist_ok=True)
+
+    filename = self.__getCacheFilename(method, page, data)
+    # write to a temporary file first, so concurrent plugins never read a partial response
+    tmpfilename = filename + '.' + str(os.getpid()) + '.' + str(threading.get_ident())
+    with open(tmpfilename, 'wb') as cachefile:
+      cachefile.write(content)
+    os.replace(tmpfilename, filename)
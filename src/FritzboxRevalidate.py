@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+  FritzboxRevalidate - serves the last result of a plugin while a slow fetch finishes
+
+  The parsed result of every successful fetch is kept in the plugin state. If a
+  fetch takes longer than env.fritzbox_stale_threshold seconds or fails, the
+  last result is printed instead, as long as it isn't older than
+  env.fritzbox_max_staleness seconds. The fetch runs in a detached process,
+  which stores its result for the next run when the plugin already answered.
+  While it runs, the following runs print the last result without starting
+  another fetch. What the detached process printed, e.g. why the fetch failed,
+  is kept in <state>.log in the plugin state.
+
+  Only plugins printing GAUGE values use it, counters must not be repeated.
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import select
+import traceback
+from typing import Callable
+from FritzboxConfig import FritzboxConfig
+from FritzboxPluginState import FritzboxPluginState
+from FritzboxDeadline import start_run
+from FritzboxScrapeStats import flush_all
+
+def load_last_result(state: FritzboxPluginState, maxStaleness: int):
+  """returns the stored result if it is recent enough, else None"""
+  last = state.load()
+  if 'time' not in last or not 0 <= time.time() - last['time'] <= maxStaleness:
+    return None
+  return last
+
+def fetch_detached(retrieve: Callable, state: FritzboxPluginState, writer: int):
+  """runs in the child process: sends the result to the plugin through the pipe and stores it"""
+  # munin-node reads the output of the plugin until all its processes closed it
+  devnull = os.open(os.devnull, os.O_RDWR)
+  try:
+    log = os.open(state.getFilename('log'), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+  except OSError:
+    log = devnull
+  os.dup2(devnull, 0)
+  os.dup2(devnull, 1)
+  os.dup2(log, 2)
+  os.setsid()
+
+  status = 1
+  try:
+    result = retrieve()
+    content = memoryview(json.dumps(result).encode())
+    try:
+      while content:
+        content = content[os.write(writer, content):]
+    except OSError:
+      # the plugin answered from the last result already
+      pass
+    os.close(writer)
+    state.save({'time': time.time(), 'result': result})
+    status = 0
+  except BaseException:
+    # nobody reads the output of the child, the log keeps why the fetch failed
+    os.write(2, ("Couldn't fetch in the background:\n" + traceback.format_exc()).encode())
+  finally:
+    # os._exit() skips the atexit handlers of the plugin
+    flush_all()
+    sys.stderr.flush()
+    os._exit(status)
+
+def read_result(reader: int, timeout: float):
+  """returns the result the child sent within the timeout, None if it was too slow or failed"""
+  deadline = time.monotonic() + timeout
+  chunks = []
+  while True:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0 or not select.select([reader], [], [], remaining)[0]:
+      return None
+    chunk = os.read(reader, 65536)
+    if not chunk:
+      break
+    chunks.append(chunk)
+  return json.loads(b''.join(chunks)) if chunks else None
+
+def retrieve_revalidating(plugin: str, retrieve: Callable, config: FritzboxConfig = None):
+  """Returns the result of retrieve(), or the last one if it takes too long or fails
+
+  :param plugin: the name of the plugin state the last result is stored in
+  :param retrieve: fetches and parses the values, its result must be JSON serializable
+  """
+  if config is None:
+    config = FritzboxConfig()
+  state = FritzboxPluginState(plugin + '_last', config)
+  last = load_last_result(state, config.maxStaleness) if config.maxStaleness > 0 else None
+  if last is None:
+    # nothing to fall back to, wait for the fetch
+    result = retrieve()
+    if config.maxStaleness > 0:
+      state.save({'time': time.time(), 'result': result})
+    return result
+
+  # the child holds the lock until its fetch is done, a slow box gets one fetch at a time
+  lock = os.open(state.getFilename('lock'), os.O_WRONLY | os.O_CREAT, 0o600)
+  try:
+    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+  except BlockingIOError:
+    os.close(lock)
+    print("Serving the values of " + str(int(time.time() - last['time'])) + " seconds ago, the fetch of a previous run is still running", file=sys.stderr)
+    return last['result']
+
+  reader, writer = os.pipe()
+  sys.stdout.flush()
+  # the child would write the stats collected so far a second time
+  flush_all()
+  pid = os.fork()
+  if pid == 0:
+    os.close(reader)
+    # the child has a deadline of its own, it may take longer than the plugin waits
+    start_run(config)
+    fetch_detached(retrieve, state, writer)
+
+  # closing the descriptor keeps the lock of the child, unlike unlocking it
+  os.close(lock)
+  os.close(writer)
+  try:
+    result = read_result(reader, config.staleThreshold)
+  finally:
+    os.close(reader)
+  if result is not None:
+    return result
+
+  print("Serving the values of " + str(int(time.time() - last['time'])) + " seconds ago, the fetch continues in the background", file=sys.stderr)
+  return last['result']
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+  FritzboxScrapeStats - timings and counters of the requests to a Fritzbox
+
+  Every request of FritzboxInterface is split into the time until the response
+  headers arrived (including connect and TLS handshake of a new connection) and
+  the transfer of the body. Together with the response sizes, the JSON parse
+  times, logins, new connections and the requests retried after a 403 they are
+  summed up per endpoint in the plugin state of the Fritzbox, over all plugin
+  runs, and graphed by fritzbox_scrape.
+
+  A run collects its stats in memory and adds them to the state once, when the
+  process exits or a daemon calls flush_all() after a collection.
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import atexit
+import weakref
+import threading
+
+# start of the request in progress, per thread, as fritzbox_all requests several pages at once
+_current = threading.local()
+# the stats of the process, written by flush_all()
+_instances = []
+
+def flush_all():
+  """writes the stats collected by all instances of the process"""
+  for stats in list(_instances):
+    stats.flush()
+
+atexit.register(flush_all)
+
+def get_endpoint(page: str, data: dict) -> str:
+  """names the endpoint of a request, data.lua serves several pages told apart by a parameter"""
+  for param in ('page', 'switchcmd'):
+    if data.get(param):
+      return page + ' ' + str(data[param])
+  return page
+
+def get_field_name(endpoint: str) -> str:
+  """converts an endpoint into a munin field name"""
+  return re.sub('[^A-Za-z0-9_]', '_', endpoint)
+
+class FritzboxScrapeStats:
+  """Accumulates the timings and counters of the requests in a JSON file next to the session"""
+  __statsFile = ""
+
+  # default constructor
+  def __init__(self, stateName: str):
+    self.__statsFile = stateName + '.stats'
+    self.__lock = threading.Lock()
+    self.__pending = {'endpoints': {}, 'session': {}}
+    # the sockets of the connections seen so far, a response on another one came through a new connection
+    self.__sockets = weakref.WeakSet()
+    _instances.append(self)
+
+  def instrument(self, http):
+    """counts the connections a requests session opens, with a response hook looking at their sockets"""
+    http.hooks['response'].append(self.__countConnection)
+
+  def __countConnection(self, response, *args, **kwargs):
+    # the hook runs before the body is read, the response still holds its connection
+    sock = getattr(getattr(response.raw, 'connection', None), 'sock', None)
+    if sock is None:
+      return
+    with self.__lock:
+      if sock not in self.__sockets:
+        self.__sockets.add(sock)
+        self.__addTo(self.__pending['session'], {'connections': 1})
+
+  def begin(self):
+    """starts timing a request of the current thread"""
+    _current.start = time.perf_counter()
+
+  def end(self, endpoint: str, response=None):
+    """records the request started with begin(), a missing response counts as an error"""
+    total = time.perf_counter() - getattr(_current, 'start', time.perf_counter())
+
+    values = {'requests': 1}
+    if response is None:
+      values['errors'] = 1
+    else:
+      # requests takes the elapsed time when the headers arrived, the body is read afterwards
+      elapsed = response.elapsed.total_seconds()
+      values.update({
+        'bytes': len(response.content),
+        'ttfb': elapsed,
+        'transfer': max(total - elapsed, 0.0),
+      })
+    self.add(endpoint, values)
+
+  def add(self, endpoint: str, values: dict):
+    """adds to the counters of an endpoint, e.g. {'retries': 1} or {'parses': 1, 'parse': 0.002}"""
+    with self.__lock:
+      self.__addTo(self.__pending['endpoints'].setdefault(endpoint, {}), values)
+
+  def count(self, counter: str):
+    """counts an event concerning the session, e.g. a login"""
+    with self.__lock:
+      self.__addTo(self.__pending['session'], {counter: 1})
+
+  @staticmethod
+  def __addTo(counters: dict, values: dict):
+    for name, value in values.items():
+      counters[name] = counters.get(name, 0) + value
+
+  def load(self) -> dict:
+    """returns {'endpoints': {endpoint: {counter: total}}, 'session': {counter: total}} as written so far"""
+    try:
+      with open(self.__statsFile, 'r') as statsfile:
+        stats = json.load(statsfile)
+    except (OSError, ValueError):
+      stats = {}
+    if not isinstance(stats, dict):
+      stats = {}
+    stats.setdefault('endpoints', {})
+    stats.setdefault('session', {})
+    return stats
+
+  def flush(self):
+    """adds the stats collected since the last flush to the file"""
+    with self.__lock:
+      pending = self.__pending
+      self.__pending = {'endpoints': {}, 'session': {}}
+    if not pending['endpoints'] and not any(pending['session'].values()):
+      return
+
+    try:
+      os.makedirs(os.path.dirname(self.__statsFile), exist_ok=True)
+      # the lock file serializes the plugins, as the counters must not lose increments
+      with open(self.__statsFile + '.lock', 'w') as lockfile:
+        fcntl.flock(lockfile, fcntl.LOCK_EX)
+        try:
+          stats = self.load()
+          for endpoint, values in pending['endpoints'].items():
+            self.__addTo(stats['endpoints'].setdefault(endpoint, {}), values)
+          self.__addTo(stats['session'], pending['session'])
+          tmpfilename = self.__statsFile + '.' + str(os.getpid()) + '.' + str(threading.get_ident())
+          with open(tmpfilename, 'w') as statsfile:
+            json.dump(stats, statsfile)
+          os.replace(tmpfilename, self.__statsFile)
+        finally:
+          fcntl.flock(lockfile, fcntl.LOCK_UN)
+    except OSError:
+      # statistics are best effort only
+      pass
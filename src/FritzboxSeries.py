@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+  FritzboxSeries - statistics of the data series the Fritzbox graphs are drawn from
+
+  The series are parsed into array-backed buffers and average, minimum, maximum,
+  95th and 99th percentile are computed together from a single sorted copy.
+  Plugins print the statistics as optional fields next to their values, e.g.
+
+  env.ecostat_stats [min] [max] [p95] [p99]
+"""
+
+import math
+from array import array
+from FritzboxConfig import FritzboxConfig, get_option
+
+STATS = ['min', 'max', 'p95', 'p99']
+
+def get_stats(plugin: str, config: FritzboxConfig = None) -> list:
+  """returns the statistics enabled for a plugin with env.<plugin>_stats"""
+  return [name for name in get_option(plugin + '_stats', config, '').split() if name in STATS]
+
+def parse_series(datapoints) -> array:
+  """converts a JSON list of numbers"""
+  return array('d', datapoints)
+
+def parse_pair_series(datapoints) -> tuple:
+  """Splits "first:second" points, e.g. the "recv:send" airtime data of the wifi graphs, into two series
+
+  Malformed points are skipped, so they don't shift the values of the following ones.
+  """
+  first, second = array('d'), array('d')
+  for point in datapoints:
+    try:
+      # unpacking fails unless there is exactly one separator
+      left, right = point.split(':')
+      left, right = float(left), float(right)
+    except (AttributeError, ValueError):
+      continue
+    first.append(left)
+    second.append(right)
+  return (first, second)
+
+class SeriesStats:
+  """average, minimum, maximum and nearest-rank percentiles of a series"""
+
+  def __init__(self, values: array):
+    self.count = len(values)
+    if not self.count:
+      self.last = self.avg = self.min = self.max = self.p95 = self.p99 = None
+      return
+
+    ordered = sorted(values)
+    self.last = values[-1]
+    self.avg = math.fsum(values) / self.count
+    self.min = ordered[0]
+    self.max = ordered[-1]
+    self.p95 = ordered[self.__rank(0.95)]
+    self.p99 = ordered[self.__rank(0.99)]
+
+  def __rank(self, percentile: float) -> int:
+    return max(math.ceil(percentile * self.count) - 1, 0)
+
+  def toDict(self, names: list) -> dict:
+    return {name: getattr(self, name) for name in names}
+
+def format_value(value) -> str:
+  """prints whole numbers without a fraction, munin reads both"""
+  if value is None:
+    return 'U'
+  return str(int(value)) if float(value).is_integer() else str(round(value, 3))
+
+def print_stats_values(field: str, stats: dict):
+  """prints the statistics of a field as <field>_<statistic>.value"""
+  for name, value in stats.items():
+    print(field + '_' + name + '.value ' + format_value(value))
+
+def print_stats_config(field: str, label: str, names: list, multiplier: int = None):
+  """prints the config of the statistics fields of a field"""
+  for name in names:
+    print(field + '_' + name + '.label ' + label + ' ' + name)
+    print(field + '_' + name + '.type GAUGE')
+    print(field + '_' + name + '.draw LINE1')
+    if multiplier is not None:
+      print(field + '_' + name + '.cdef ' + field + '_' + name + ',' + str(multiplier) + ',*')
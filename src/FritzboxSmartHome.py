@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+  FritzboxSmartHome - retrieves all smart home devices with a single request
+
+  The AHA HTTP interface lists every device with all its capabilities in one
+  XML document, instead of one TR-064 GetGenericDeviceInfos call per device.
+
+  @see https://avm.de/fileadmin/user_upload/Global/Service/Schnittstellen/AHA-HTTP-Interface.pdf
+"""
+
+import io
+import xml.etree.ElementTree as ElementTree
+from FritzboxInterface import FritzboxInterface
+
+PAGE = 'webservices/homeautoswitch.lua'
+PARAMS = {'switchcmd': 'getdevicelistinfos'}
+
+def parse_device(element) -> dict:
+  """flattens a <device> element, e.g. {'identifier': ..., 'name': ..., 'temperature': {'celsius': ...}}"""
+  device = dict(element.attrib)
+  for child in element:
+    if len(child):
+      device[child.tag] = {grandchild.tag: (grandchild.text or '').strip() for grandchild in child}
+    else:
+      device[child.tag] = (child.text or '').strip()
+  return device
+
+def parse_device_list(content: bytes) -> dict:
+  """Returns the devices of a device list keyed by their AIN, groups are left out
+
+  The list is parsed incrementally and every device is dropped from the tree once
+  it is flattened, so memory doesn't grow with the XML tree of hundreds of devices.
+  """
+  devices = {}
+  root = None
+  for event, element in ElementTree.iterparse(io.BytesIO(content), events=('start', 'end')):
+    if root is None:
+      root = element
+    elif event == 'end' and element.tag == 'device':
+      device = parse_device(element)
+      devices[device['identifier']] = device
+      root.clear()
+    elif event == 'end' and element.tag == 'group':
+      root.clear()
+  return devices
+
+def retrieve_devices(interface: FritzboxInterface) -> dict:
+  """download the device list, cached for the config and fetch runs of one munin cycle"""
+  return parse_device_list(interface.getPageWithLogin(PAGE, data=dict(PARAMS)))
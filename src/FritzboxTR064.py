@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+  FritzboxTR064 - a lean TR-064 client for the munin plugins
+
+  Parsing the box's tr64desc.xml/igddesc.xml and downloading every service
+  description (SCPD) takes dozens of requests. The parsed services and actions
+  are therefore kept in MUNIN_PLUGSTATE and only refreshed when the firmware
+  version of the box changes, so a plugin run only sends its actual SOAP calls.
+
+  @see https://avm.de/service/schnittstellen/
+"""
+
+import os
+import json
+import time
+import threading
+import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import escape
+from FritzboxConfig import FritzboxConfig
+from FritzboxFileSession import FritzboxFileSession
+from FritzboxExceptions import FritzboxConnectionError, FritzboxTimeoutError
+from FritzboxDeadline import check_reachable, count_failure, get_timeouts
+
+TCP_PORT = 49000
+TLS_PORT = 49443
+DESCRIPTIONS = ['tr64desc.xml', 'igddesc.xml']
+# seconds until the firmware version of the box is compared with the cached descriptions again
+RECHECK = 3600
+
+ENVELOPE = ('<?xml version="1.0" encoding="utf-8"?>'
+            '<s:Envelope s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/" xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">'
+            '<s:Body><u:{action} xmlns:u="{serviceType}">{arguments}</u:{action}></s:Body></s:Envelope>')
+CONVERSIONS = {
+  'boolean': lambda value: value == '1',
+  'i1': int, 'i2': int, 'i4': int,
+  'ui1': int, 'ui2': int, 'ui4': int, 'ui8': int
+}
+
+def local_name(element) -> str:
+  """strips the namespace from an element's tag, descriptions use different namespaces"""
+  return element.tag.rsplit('}', 1)[-1]
+
+def find_text(element, name: str) -> str:
+  for child in element:
+    if local_name(child) == name:
+      return (child.text or '').strip()
+  return None
+
+def find_children(element, name: str) -> list:
+  return [child for child in element.iter() if local_name(child) == name]
+
+class FritzboxTR064:
+  config = None
+  __http = None
+  __verify = None
+  __baseUri = ""
+  __session = None
+  __cacheFile = ""
+  __cache = None
+
+  # default constructor
+  def __init__(self, config: FritzboxConfig = None):
+    self.config = config if config is not None else FritzboxConfig()
+    self.__session = FritzboxFileSession(self.config.server, self.config.user, self.config.port)
+    self.__cacheFile = self.__session.getSessionDir() + '/' + self.__session.getSessionName() + '.tr64'
+    # fritzbox_all shares one client between the threads of a box, the descriptions are loaded once for all
+    self.__lock = threading.RLock()
+    port = self.config.tr064Port or (TCP_PORT, TLS_PORT)[self.config.useTls]
+    self.__baseUri = '{}://{}:{}'.format(('http', 'https')[self.config.useTls], self.config.server, port)
+
+  def __getHttp(self):
+    """one keep-alive session for all calls, which also keeps the digest authentication state"""
+    with self.__lock:
+      if self.__http is None:
+        import requests
+        from requests.auth import HTTPDigestAuth
+        http = requests.Session()
+        http.auth = HTTPDigestAuth(self.config.user, self.config.password)
+        # the TR-064 port uses the box certificate as well, but fritzconnection never checked it
+        if os.path.exists(self.config.certificateFile):
+          self.__verify = self.config.certificateFile
+        else:
+          import urllib3
+          urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+          self.__verify = False
+        self.__http = http
+    return self.__http
+
+  def __request(self, method: str, path: str, **kwargs):
+    """sends a request within the deadline of the run, skipping it while the box is unreachable"""
+    import requests
+
+    check_reachable(self.__session)
+    http = self.__getHttp()
+    try:
+      r = http.request(method, self.__baseUri + path, verify=self.__verify, timeout=get_timeouts(self.config), **kwargs)
+    except requests.exceptions.Timeout as e:
+      count_failure(self.__session)
+      raise FritzboxTimeoutError(str(e)) from e
+    except requests.exceptions.RequestException as e:
+      count_failure(self.__session)
+      raise FritzboxConnectionError(str(e)) from e
+    self.__session.clearFailures()
+    return r
+
+  def __download(self, path: str) -> bytes:
+    r = self.__request('GET', path)
+    r.raise_for_status()
+    return r.content
+
+  def __getFirmwareVersion(self, description) -> str:
+    for version in find_children(description, 'systemVersion'):
+      return find_text(version, 'Display')
+    return None
+
+  def __loadDescriptions(self, firmware: str, description) -> dict:
+    """parses the device descriptions and the description of every service"""
+    services = {}
+    descriptions = {DESCRIPTIONS[0]: description}
+    for name in DESCRIPTIONS[1:]:
+      try:
+        descriptions[name] = ElementTree.fromstring(self.__download('/' + name))
+      except Exception:
+        # not every box (e.g. repeaters) offers the IGD description
+        continue
+
+    for root in descriptions.values():
+      for service in find_children(root, 'service'):
+        serviceName = find_text(service, 'serviceId').rsplit(':', 1)[-1]
+        scpd = ElementTree.fromstring(self.__download(find_text(service, 'SCPDURL')))
+        dataTypes = {find_text(v, 'name'): find_text(v, 'dataType') for v in find_children(scpd, 'stateVariable')}
+        actions = {}
+        for action in find_children(scpd, 'action'):
+          arguments = {}
+          for argument in find_children(action, 'argument'):
+            if find_text(argument, 'direction') == 'out':
+              arguments[find_text(argument, 'name')] = dataTypes.get(find_text(argument, 'relatedStateVariable'), 'string')
+          actions[find_text(action, 'name')] = arguments
+        services[serviceName] = {'serviceType': find_text(service, 'serviceType'), 'controlURL': find_text(service, 'controlURL'), 'actions': actions}
+
+    return {'firmware': firmware, 'checked': time.time(), 'services': services}
+
+  def __saveCache(self, cache: dict):
+    statedir = os.path.dirname(self.__cacheFile)
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+
+    # connection_uptime and traffic of fritzbox_all save the descriptions from two threads
+    tmpfilename = self.__cacheFile + '.' + str(os.getpid()) + '.' + str(threading.get_ident())
+    with open(tmpfilename, 'w') as cachefile:
+      json.dump(cache, cachefile)
+    os.replace(tmpfilename, self.__cacheFile)
+
+  def __loadCache(self) -> dict:
+    try:
+      with open(self.__cacheFile, 'r') as cachefile:
+        return json.load(cachefile)
+    except (OSError, ValueError):
+      return None
+
+  def __getServices(self) -> dict:
+    with self.__lock:
+      if self.__cache is not None:
+        return self.__cache['services']
+
+      cache = self.__loadCache()
+      if cache is None or time.time() - cache['checked'] > RECHECK or time.time() < cache['checked']:
+        # tr64desc.xml carries the firmware version, only download the service descriptions if it changed
+        description = ElementTree.fromstring(self.__download('/' + DESCRIPTIONS[0]))
+        firmware = self.__getFirmwareVersion(description)
+        if cache is not None and cache['firmware'] == firmware:
+          cache['checked'] = time.time()
+        else:
+          cache = self.__loadDescriptions(firmware, description)
+        self.__saveCache(cache)
+
+      self.__cache = cache
+      return cache['services']
+
+  def getFirmwareVersion(self) -> str:
+    """returns the firmware version the cached descriptions belong to"""
+    self.__getServices()
+    return self.__cache['firmware']
+
+  def loadFirmwareVersion(self) -> str:
+    """returns the firmware version of the cached descriptions without asking the box, None if there are none"""
+    cache = self.__cache if self.__cache is not None else self.__loadCache()
+    return cache.get('firmware') if isinstance(cache, dict) else None
+
+  def callAction(self, serviceName: str, actionName: str, arguments={}) -> dict:
+    """Calls a TR-064 action and returns its out arguments converted to Python types
+
+    :param serviceName: the service id without its urn, e.g. 'WANIPConn1'
+    :param actionName: e.g. 'GetStatusInfo'
+    :param arguments: the in arguments of the action
+    """
+    services = self.__getServices()
+    if serviceName not in services or actionName not in services[serviceName]['actions']:
+      raise Exception("Unknown TR-064 action " + serviceName + "." + actionName)
+    service = services[serviceName]
+
+    argumentXml = ''.join('<{0}>{1}</{0}>'.format(name, escape(str(value))) for name, value in arguments.items())
+    body = ENVELOPE.format(action=actionName, serviceType=service['serviceType'], arguments=argumentXml)
+    headers = {'Content-Type': 'text/xml; charset="utf-8"', 'SOAPAction': service['serviceType'] + '#' + actionName}
+    r = self.__request('POST', service['controlURL'], data=body.encode(), headers=headers)
+
+    if r.status_code != 200:
+      try:
+        error = find_children(ElementTree.fromstring(r.content), 'errorDescription')
+      except ElementTree.ParseError:
+        error = []
+      raise Exception("TR-064 action " + serviceName + "." + actionName + " failed: " + (error[0].text if error else str(r.status_code)))
+
+    root = ElementTree.fromstring(r.content)
+    result = {}
+    dataTypes = service['actions'][actionName]
+    for element in root.iter():
+      name = local_name(element)
+      if name in dataTypes:
+        value = element.text or ''
+        result[name] = CONVERSIONS[dataTypes[name]](value) if dataTypes[name] in CONVERSIONS and value else value
+    return result
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+  fritzbox_all - A munin plugin for Linux combining all fritzbox_* plugins into
+  one multigraph plugin, fetching all pages concurrently with a single login
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Add the following section to your munin-node's plugin configuration:
+
+  [fritzbox_*]
+  env.fritzbox_ip [ip address of the fritzbox]
+  env.fritzbox_password [fritzbox password]
+  env.fritzbox_user [fritzbox user, set any value if not required]
+  env.all_plugins [connection_uptime] [dsl] [ecostat] [energy] [link_saturation] [smart_home] [smart_home_temperature] [traffic] [wifi_load]
+  env.all_max_workers [number of concurrent requests, optional]
+
+  The options of the combined plugins (e.g. env.ecostat_modes) apply as well.
+
+  Several boxes (e.g. a FRITZ!Box and its repeaters) are polled concurrently by
+  listing them in env.fritzbox_targets. The settings of a box are read from
+  env.fritzbox_<target>_<setting>, falling back to env.fritzbox_<setting>, and
+  plugin options from env.<target>_<option>, falling back to env.<option>:
+
+  env.fritzbox_targets box repeater
+  env.fritzbox_box_ip 192.168.178.1
+  env.fritzbox_repeater_ip 192.168.178.2
+  env.fritzbox_repeater_host_name repeater.fritz.box [munin host of the graphs, defaults to the ip]
+  env.repeater_all_plugins energy wifi_load
+  env.repeater_energy_product repeater
+
+  The graphs of each box are printed for its own munin host with host_name.
+  The single graph plugins connection_uptime, smart_home_temperature and traffic
+  are shown as multigraphs of the same name.
+
+  The config of connection_uptime, dsl, smart_home, smart_home_temperature and
+  traffic is kept and printed without requests while the box stays the same
+  (see FritzboxConfigCache).
+
+  This plugin supports the following munin configuration parameters:
+  #%# family=auto contrib
+  #%# capabilities=autoconf
+"""
+
+import os
+import sys
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from FritzboxConfig import FritzboxConfig, get_option, get_targets
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxInterface import FritzboxInterface
+
+MAX_WORKERS = 8
+
+class CombinedPlugin:
+  """the endpoints one of the fritzbox_* plugins needs for its config and values, and how to print them"""
+
+  def __init__(self, name: str, graph: str, configFetches: dict, valueFetches: dict, printConfig, printValues, fingerprint=None, options: list = None):
+    self.name = name
+    self.graph = graph # set for single graph plugins which don't print a multigraph header themselves
+    self.configFetches = configFetches
+    self.valueFetches = valueFetches
+    self.printConfig = printConfig
+    self.printValues = printValues
+    # set for plugins whose config is kept, returns the fingerprint of the values and the previous one
+    self.fingerprint = fingerprint
+    self.options = options if options is not None else []
+
+def get_plugins(config: FritzboxConfig = None):
+  return get_option('all_plugins', config).split(' ')
+
+def get_max_workers():
+  return int(os.getenv('all_max_workers', MAX_WORKERS))
+
+def create_plugin(name: str, config: FritzboxConfig = None, backfill: bool = None) -> CombinedPlugin:
+  """
+  :param config: the box the plugin polls, its options are read with env.<target>_<option> of a box of env.fritzbox_targets
+  :param backfill: whether ecostat prints the samples of missed runs, None reads env.ecostat_backfill
+  """
+  # only import the enabled plugins, keeping the startup short
+  module = importlib.import_module('fritzbox_' + name)
+
+  if name == 'connection_uptime':
+    def fetch_uptime(interface):
+      uptime = module.FritzboxConnectionUptime(interface.config, interface.getTR064())
+      return (uptime, uptime.retrieveUptime())
+    def fetch_ips(interface):
+      uptime = module.FritzboxConnectionUptime(interface.config, interface.getTR064())
+      return (uptime, uptime.retrieveExternalIps())
+    return CombinedPlugin(name, name, {'ips': fetch_ips}, {'uptime': fetch_uptime},
+                          lambda data: data['ips'][0].printConfig(data['ips'][1]),
+                          lambda data: data['uptime'][0].printUptime(data['uptime'][1]),
+                          lambda data, previous: data['uptime'][0].getFingerprint(data['uptime'][1], previous))
+  if name == 'dsl':
+    return CombinedPlugin(name, None, {'max': module.retrieve_max_values}, {'stats': module.retrieve_dsl_stats},
+                          lambda data: module.print_config(data['max'], config),
+                          lambda data: module.print_dsl_stats(data['stats'], config),
+                          lambda data, previous: module.get_fingerprint(data['stats']), ['dsl_modes'])
+  if name == 'ecostat':
+    # the samples printed last are kept per box
+    return CombinedPlugin(name, None, {}, {'stats': lambda interface: module.retrieve_system_stats(interface, backfill)},
+                          lambda data: module.print_config(config),
+                          lambda data: module.print_system_stats(data['stats'], config, backfill))
+  if name == 'energy':
+    return CombinedPlugin(name, None, {}, {'stats': module.retrieve_energy_stats},
+                          lambda data: module.print_config(config),
+                          lambda data: module.print_energy_stats(data['stats'], config))
+  if name == 'link_saturation':
+    return CombinedPlugin(name, None, {}, {'saturation': module.retrieve_link_saturation},
+                          lambda data: module.print_config(config),
+                          lambda data: module.print_link_saturation(data['saturation'], config))
+  if name == 'smart_home':
+    fetches = {'devices': module.retrieve_smart_home}
+    return CombinedPlugin(name, None, fetches, fetches,
+                          lambda data: module.print_config(data['devices'], config),
+                          lambda data: module.print_smart_home(data['devices'], config),
+                          lambda data, previous: module.get_fingerprint(data['devices']), ['smart_home_modes'])
+  if name == 'smart_home_temperature':
+    fetches = {'temps': module.retrieveSmartHomeTemps}
+    return CombinedPlugin(name, name, fetches, fetches,
+                          lambda data: module.printConfig(data['temps']),
+                          lambda data: module.printSmartHomeTemperature(data['temps']),
+                          lambda data, previous: module.getFingerprint(data['temps']))
+  if name == 'traffic':
+    def fetch_traffic(interface):
+      traffic = module.FritzboxTraffic(interface.config, interface.getTR064())
+      return (traffic, traffic.retrieveTraffic())
+    fetches = {'traffic': fetch_traffic}
+    return CombinedPlugin(name, name, fetches, fetches,
+                          lambda data: data['traffic'][0].printConfig(),
+                          lambda data: data['traffic'][0].printTraffic(data['traffic'][1]),
+                          lambda data, previous: data['traffic'][0].getFingerprint(data['traffic'][1]), ['traffic_remove_max'])
+  if name == 'wifi_load':
+    return CombinedPlugin(name, None, {}, {'load': module.retrieve_wifi_load},
+                          lambda data: module.print_config(config),
+                          lambda data: module.print_wifi_load(data['load'], config))
+  raise Exception("No such plugin: " + name)
+
+def get_config_caches(plugins: list, config: FritzboxConfig) -> dict:
+  """returns the config caches of the plugins whose config is kept"""
+  return {plugin.name: FritzboxConfigCache(plugin.name, plugin.options, config) for plugin in plugins if plugin.fingerprint}
+
+def submit_all(executor: ThreadPoolExecutor, plugins: list, interface: FritzboxInterface, config: bool, values: bool, configCaches: dict = None) -> dict:
+  """submits the fetches of all plugins, returns their futures per plugin"""
+  if configCaches is None:
+    configCaches = {}
+  futures = {}
+  for plugin in plugins:
+    fetches = {}
+    if config and (plugin.name not in configCaches or configCaches[plugin.name].loadConfig() is None):
+      fetches.update(plugin.configFetches)
+    if values:
+      fetches.update(plugin.valueFetches)
+    futures[plugin.name] = {key: executor.submit(fetch, interface) for key, fetch in fetches.items()}
+  return futures
+
+def collect_all(plugins: list, futures: dict) -> dict:
+  """waits for the fetches of all plugins, leaving out the plugins which failed"""
+  results = {}
+  for plugin in plugins:
+    try:
+      results[plugin.name] = {key: future.result() for key, future in futures[plugin.name].items()}
+    except (SystemExit, Exception) as e:
+      # SystemExit is raised by the plugins' own error handling, don't let it hide the other plugins
+      print("Couldn't retrieve fritzbox " + plugin.name + ": " + str(e), file=sys.stderr)
+  return results
+
+def retrieve_all(plugins: list, interface: FritzboxInterface, config: bool, values: bool) -> dict:
+  """fetch the endpoints of all plugins concurrently, so a run takes as long as the slowest endpoint"""
+  with ThreadPoolExecutor(max_workers=get_max_workers()) as executor:
+    futures = submit_all(executor, plugins, interface, config, values)
+  return collect_all(plugins, futures)
+
+def record_fingerprints(plugins: list, results: dict, configCaches: dict):
+  """records the fingerprints of the fetched values, deciding whether the kept config is still valid"""
+  for plugin in plugins:
+    if plugin.name in configCaches and plugin.name in results:
+      configCache = configCaches[plugin.name]
+      try:
+        configCache.setFingerprint(plugin.fingerprint(results[plugin.name], configCache.getFingerprint()))
+      except Exception as e:
+        print("Couldn't record the fingerprint of fritzbox " + plugin.name + ": " + str(e), file=sys.stderr)
+
+def print_all(plugins: list, results: dict, printer: str, configCaches: dict = None):
+  if configCaches is None:
+    configCaches = {}
+  failed = False
+  for plugin in plugins:
+    if plugin.name not in results:
+      failed = True
+      continue
+    if plugin.graph:
+      print("multigraph " + plugin.graph)
+    try:
+      if printer == 'printConfig' and plugin.name in configCaches:
+        configCaches[plugin.name].printConfig(lambda: plugin.printConfig(results[plugin.name]))
+      else:
+        getattr(plugin, printer)(results[plugin.name])
+    except Exception as e:
+      print("Couldn't print fritzbox " + plugin.name + ": " + str(e), file=sys.stderr)
+      failed = True
+  return failed
+
+def main(config: bool, values: bool):
+  # all boxes share one pool, which bounds the concurrent requests of the whole run
+  polls = []
+  with ThreadPoolExecutor(max_workers=get_max_workers()) as executor:
+    for target in get_targets() or [None]:
+      interface = FritzboxInterface(config=FritzboxConfig(target))
+      plugins = [create_plugin(name, interface.config) for name in get_plugins(interface.config)]
+      configCaches = get_config_caches(plugins, interface.config)
+      futures = submit_all(executor, plugins, interface, config, values, configCaches)
+      polls.append((interface.config, plugins, configCaches, futures))
+
+  failed = False
+  for targetConfig, plugins, configCaches, futures in polls:
+    results = collect_all(plugins, futures)
+    if values:
+      record_fingerprints(plugins, results, configCaches)
+    if targetConfig.hostName:
+      print("host_name " + targetConfig.hostName)
+    if config:
+      failed |= print_all(plugins, results, 'printConfig', configCaches)
+    if values:
+      failed |= print_all(plugins, results, 'printValues')
+  if failed:
+    sys.exit(1)
+
+if __name__ == "__main__":
+  if len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
+    print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
+  elif len(sys.argv) == 2 and sys.argv[1] == 'config':
+    # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+    main(True, os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1')
+  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+    main(False, True)
@@ -5,8 +5,6 @@
   Author: Christian Stade-Schuldt
   Like Munin, this plugin is licensed under the GNU GPL v2 license
   http://www.opensource.org/licenses/GPL-2.0
-  This plugin requires the fritzconnection plugin. To install it using pip:
-  pip install fritzconnection
 
   Add the following section to your munin-node's plugin configuration:
 
@@ -20,23 +18,46 @@
 
 import os
 import sys
-from fritzconnection.lib.fritzstatus import FritzStatus
+import time
 from FritzboxConfig import FritzboxConfig
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxTR064 import FritzboxTR064
+
+# seconds the start of the connection, computed from its uptime, may differ between runs without a reconnect
+RECONNECT_TOLERANCE = 60
 
 class FritzboxConnectionUptime:
   __connection = None
 
-  def __init__(self):
-    config = FritzboxConfig()
-    try:
-      self.__connection = FritzStatus(address=config.server, user=config.user, password=config.password, use_tls=config.useTls)
-    except Exception as e:
-      sys.exit("Couldn't get connection uptime: " + str(e))
+  def __init__(self, config: FritzboxConfig = None, connection: FritzboxTR064 = None):
+    """
+    :param connection: the TR-064 client of the box, e.g. shared with other plugins, a new one if None
+    """
+    self.__connection = connection if connection is not None else FritzboxTR064(config)
 
-  def printUptime(self):
-    print('uptime.value %.2f' % (int(self.__connection.uptime) / 3600.0))
+  def retrieveUptime(self):
+    return int(self.__connection.callAction('WANIPConn1', 'GetStatusInfo')['NewUptime'])
 
-  def printConfig(self):
+  def printUptime(self, uptime):
+    print('uptime.value %.2f' % (uptime / 3600.0))
+
+  def getFingerprint(self, uptime, previous):
+    """the start of the connection, the external IPs of the config change with a reconnect"""
+    start = int(time.time()) - uptime
+    if previous is not None and abs(start - previous) <= RECONNECT_TOLERANCE:
+      return previous
+    return start
+
+  def retrieveExternalIps(self):
+    ipv4 = self.__connection.callAction('WANIPConn1', 'GetExternalIPAddress')['NewExternalIPAddress']
+    try:
+      ipv6 = self.__connection.callAction('WANIPConn1', 'X_AVM_DE_GetExternalIPv6Address')['NewExternalIPv6Address']
+    except Exception:
+      # boxes without IPv6 support don't offer the action
+      ipv6 = ''
+    return (ipv4, ipv6)
+
+  def printConfig(self, externalIps):
     print("graph_title Connection Uptime")
     print("graph_args --base 1000 -l 0")
     print("graph_vlabel uptime in hours")
@@ -44,16 +65,24 @@ class FritzboxConnectionUptime:
     print("graph_category network")
     print("uptime.label uptime")
     print("uptime.draw AREA")
-    print("graph_info The uptime in hours after the last disconnect.<br />Public IP address (ipv4): " + self.__connection.external_ip + ", Public IP address (ipv6): " + self.__connection.external_ipv6)
+    print("graph_info The uptime in hours after the last disconnect.<br />Public IP address (ipv4): " + externalIps[0] + ", Public IP address (ipv6): " + externalIps[1])
 
 if __name__ == "__main__":
+  if len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
+    print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
+    sys.exit(0)
   uptime = FritzboxConnectionUptime()
+  configCache = FritzboxConfigCache('connection_uptime')
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    uptime.printConfig()
-  elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
-    print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
-  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
     try:
-      uptime.printUptime()
+      configCache.printConfig(lambda: uptime.printConfig(uptime.retrieveExternalIps()))
+    except Exception as e:
+      sys.exit("Couldn't get connection uptime: " + str(e))
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
+    try:
+      value = uptime.retrieveUptime()
+      configCache.setFingerprint(uptime.getFingerprint(value, configCache.getFingerprint()))
+      uptime.printUptime(value)
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox connection uptime: " + str(e))
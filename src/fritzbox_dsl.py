@@ -14,6 +14,11 @@
   env.fritzbox_password [fritzbox password]
   env.fritzbox_user [fritzbox user, set any value if not required]
   env.dsl_modes [capacity] [snr] [damping] [errors] [crc]
+  env.locale [de|en] (the language of the FRITZ!Box web interface, default de)
+
+  The values are read from the tables of the DSL statistics page, finding the
+  rows by their labels. FRITZ!OS has no data.lua JSON page with these values
+  which could be checked against a real box, so the HTML page is still used.
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -23,12 +28,42 @@
 import os
 import sys
 import json
-from lxml import html
+from FritzboxExceptions import FritzboxResponseError
+from FritzboxConfig import FritzboxConfig, get_option
 from FritzboxInterface import FritzboxInterface
+from FritzboxConfigCache import FritzboxConfigCache
 
 PAGE = 'internet/dsl_stats_tab.lua'
 PARAMS = {'update':'mainDiv', 'useajax':1, 'xhr':1}
 
+# the ids of the tables and the cells of their receive and send values
+TABLES = {'uiTransmission': (2, 3), 'uiErrors': (1, 2)}
+# the labels of the rows per locale, the per minute rows of the errors, not those of the last 15 minutes
+LABELS = {
+  'de': {
+    'Leitungskapazität': 'capacity',
+    'Aktuelle Datenrate': 'rate',
+    'Störabstandsmarge': 'snr',
+    'Leitungsdämpfung': 'damping',
+    'Sekunden mit Fehlern (ES)': 'es',
+    'Sekunden mit vielen Fehlern (SES)': 'ses',
+    'CRC-Fehler pro Minute': 'crc',
+    'Korrigierbare Fehler pro Minute': 'corr',
+    'Nicht korrigierbare Fehler pro Minute': 'fail',
+  },
+  'en': {
+    'Line capacity': 'capacity',
+    'Current data rate': 'rate',
+    'Signal-to-noise ratio': 'snr',
+    'Line attenuation': 'damping',
+    'Errored seconds (ES)': 'es',
+    'Severely errored seconds (SES)': 'ses',
+    'CRC errors per minute': 'crc',
+    'Correctable errors per minute': 'corr',
+    'Uncorrectable errors per minute': 'fail',
+  },
+}
+
 TITLES = {
   'capacity': 'Link Capacity',
   'rate': 'Synced Rate',
@@ -57,8 +92,8 @@ VLABELS = {
   'ecc': 'n',
 }
 
-def get_modes():
-  return os.getenv('dsl_modes').split(' ')
+def get_modes(config: FritzboxConfig = None):
+  return get_option('dsl_modes', config).split(' ')
 
 def print_graph(name, recv, send, prefix=""):
   if name:
@@ -66,61 +101,78 @@ def print_graph(name, recv, send, prefix=""):
   print(prefix + "recv.value " + recv)
   print(prefix + "send.value " + send)
 
-def print_dsl_stats():
-  """print the current DSL statistics"""
+def read_tables(data, locale: str = 'de') -> dict:
+  """Returns receive and send value of the rows of LABELS in the dsl_stats_tab.lua fragment
+
+  The tables are found by their ids and the rows by their labels, with a single
+  XPath query walking the fragment once. Rows moved or added by a firmware
+  update are still found.
+
+  :raises FritzboxResponseError: if a row is missing
+  """
+  # lxml takes a while to import, runs printing the kept config don't need it
+  from lxml import html
+  labels = LABELS[locale]
+  if isinstance(data, bytes):
+    # the box sends UTF-8, which lxml can't tell from a fragment without a meta tag
+    data = data.decode('utf-8')
+  root = html.fragment_fromstring(data, create_parent=True)
+  stats = {}
+  # the first cell of every row of the tables holds the label
+  for label in root.xpath('//table[' + ' or '.join('@id="%s"' % table for table in TABLES) + ']/tr/td[1]'):
+    name = labels.get((label.text or '').strip())
+    if name is None:
+      continue
+    row = label.getparent()
+    recv, send = TABLES[row.getparent().get('id')]
+    stats[name] = (row[recv].text_content().strip(), row[send].text_content().strip())
+
+  missing = [label for label, name in labels.items() if name not in stats]
+  if missing:
+    raise FritzboxResponseError("No DSL statistics found for " + ", ".join(missing))
+  return stats
 
-  modes = get_modes()
+def retrieve_dsl_stats(interface: FritzboxInterface) -> dict:
+  """download the table"""
+  return read_tables(interface.getPageWithLogin(PAGE, data=PARAMS), get_option('locale', interface.config, 'de'))
 
-  # download the table
-  data = FritzboxInterface().getPageWithLogin(PAGE, data=PARAMS)
-  root = html.fragments_fromstring(data)
+def print_dsl_stats(stats, config: FritzboxConfig = None):
+  """print the current DSL statistics"""
+
+  modes = get_modes(config)
 
   if 'capacity' in modes:
-    capacity_recv = root[1].xpath('tr[position() = 4]/td[position() = 3]')[0].text
-    capacity_send = root[1].xpath('tr[position() = 4]/td[position() = 4]')[0].text
-    print_graph("dsl_capacity", capacity_recv, capacity_send)
+    print_graph("dsl_capacity", *stats['capacity'])
 
   if 'rate' in modes:
-    rate_recv = root[1].xpath('tr[position() = 5]/td[position() = 3]')[0].text
-    rate_send = root[1].xpath('tr[position() = 5]/td[position() = 4]')[0].text
-    print_graph("dsl_rate", rate_recv, rate_send)
+    print_graph("dsl_rate", *stats['rate'])
 
   if 'snr' in modes: # Störabstandsmarge
-    snr_recv = root[1].xpath('tr[position() = 13]/td[position() = 3]')[0].text
-    snr_send = root[1].xpath('tr[position() = 13]/td[position() = 4]')[0].text
-    print_graph("dsl_snr", snr_recv, snr_send)
+    print_graph("dsl_snr", *stats['snr'])
 
   if 'damping' in modes: # Leitungsdämpfung
-    damping_recv = root[1].xpath('tr[position() = 15]/td[position() = 3]')[0].text
-    damping_send = root[1].xpath('tr[position() = 15]/td[position() = 4]')[0].text
-    print_graph("dsl_damping", damping_recv, damping_send)
+    print_graph("dsl_damping", *stats['damping'])
 
   if 'errors' in modes:
-    es_recv = root[4].xpath('tr[position() = 3]/td[position() = 2]')[0].text
-    es_send = root[4].xpath('tr[position() = 3]/td[position() = 3]')[0].text
-    ses_recv = root[4].xpath('tr[position() = 4]/td[position() = 2]')[0].text
-    ses_send = root[4].xpath('tr[position() = 4]/td[position() = 3]')[0].text
-    print_graph("dsl_errors", es_recv, es_send, prefix="es_")
-    print_graph(None, ses_recv, ses_send, prefix="ses_")
+    print_graph("dsl_errors", *stats['es'], prefix="es_")
+    print_graph(None, *stats['ses'], prefix="ses_")
 
   if 'crc' in modes:
-    crc_recv = root[4].xpath('tr[position() = 7]/td[position() = 2]')[0].text
-    crc_send = root[4].xpath('tr[position() = 7]/td[position() = 3]')[0].text
-    print_graph("dsl_crc", crc_recv, crc_send)
+    print_graph("dsl_crc", *stats['crc'])
 
   if 'ecc' in modes:
-    corr_recv = root[4].xpath('tr[position() = 11]/td[position() = 2]')[0].text
-    corr_send = root[4].xpath('tr[position() = 11]/td[position() = 3]')[0].text
-    fail_recv = root[4].xpath('tr[position() = 15]/td[position() = 2]')[0].text
-    fail_send = root[4].xpath('tr[position() = 15]/td[position() = 3]')[0].text
-    print_graph("dsl_ecc", corr_recv, corr_send, prefix="corr_")
-    print_graph(None, fail_recv, fail_send, prefix="fail_")
-
-def retrieve_max_values():
+    print_graph("dsl_ecc", *stats['corr'], prefix="corr_")
+    print_graph(None, *stats['fail'], prefix="fail_")
+
+def get_fingerprint(stats):
+  """the synced rates, the warning limits of the config change with them"""
+  return stats['rate']
+
+def retrieve_max_values(interface: FritzboxInterface):
   max = {}
   page = 'internet/inetstat_monitor.lua'
   params = {'useajax':1, 'action':'get_graphic', 'xhr':1, 'myXhr':1}
-  data = FritzboxInterface().getPageWithLogin(page, data=params)
+  data = interface.getPageWithLogin(page, data=params)
 
   # Retrieve max values
   jsondata = json.loads(data)[0]
@@ -129,9 +181,8 @@ def retrieve_max_values():
 
   return max
 
-def print_config():
-  modes = get_modes()
-  max = retrieve_max_values()
+def print_config(max, config: FritzboxConfig = None):
+  modes = get_modes(config)
 
   for mode in ['capacity', 'rate', 'snr', 'damping', 'crc']:
     if not mode in modes:
@@ -179,12 +230,19 @@ def print_config():
       print(p + ".warning 1")
 
 if __name__ == "__main__":
-  if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    print_config()
-  elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
+  if len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
-  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+    sys.exit(0)
+  # config and (dirty config) fetch share one session
+  interface = FritzboxInterface()
+  configCache = FritzboxConfigCache('dsl', ['dsl_modes'], interface.config)
+  if len(sys.argv) == 2 and sys.argv[1] == 'config':
+    configCache.printConfig(lambda: print_config(retrieve_max_values(interface)))
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
     try:
-      print_dsl_stats()
+      stats = retrieve_dsl_stats(interface)
+      configCache.setFingerprint(get_fingerprint(stats))
+      print_dsl_stats(stats)
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox dsl stats: " + str(e))
@@ -14,6 +14,8 @@
   env.fritzbox_password [fritzbox password]
   env.fritzbox_user [fritzbox user, set any value if not required]
   env.ecostat_modes [cpu] [temp] [ram]
+  env.ecostat_stats [min] [max] [p95] [p99] (optional statistics of the cpu and temp series)
+  env.ecostat_backfill [1|0] (print the samples of missed runs with their time, default 1, needs munin 2.0)
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -22,55 +24,130 @@
 
 import os
 import sys
+import time
+from FritzboxConfig import FritzboxConfig, get_option
 from FritzboxInterface import FritzboxInterface
+from FritzboxPluginState import FritzboxPluginState
+from FritzboxRevalidate import retrieve_revalidating
+from FritzboxSeries import SeriesStats, get_stats, parse_series, print_stats_config, print_stats_values
 
 PAGE = 'data.lua'
 PARAMS = {'xhr':1, 'lang':'de', 'page':'ecoStat', 'xhrId':'all', 'useajax':1, 'no_sidrenew':None}
+# the graphs the plugin prints, the page carries more
+PATHS = [('data', 'cpuutil'), ('data', 'cputemp'), ('data', 'ramusage')]
 RAMLABELS = ['strict', 'cache', 'free']
+# the ecoStat series cover the last 24 hours, the last sample is the latest
+SERIES_PERIOD = 86400
 
-def get_modes():
-  return os.getenv('ecostat_modes').split(' ')
+def get_modes(config: FritzboxConfig = None):
+  return get_option('ecostat_modes', config).split(' ')
 
-def print_simple_series(data, name, graph, low=None, high=None):
-  """print last value of first json data series"""
-  print_multi_series(data, [name], graph, low, high)
+def is_backfill_enabled(config: FritzboxConfig = None):
+  return get_option('ecostat_backfill', config, '1') != '0'
 
-def print_multi_series(data, names, graph, low=None, high=None):
-  """print last value of multiple json data series"""
+def count_new_samples(fetched: float, cursor: float, interval: float) -> tuple:
+  """Returns how many samples the Fritzbox took after the cursor and the time of the latest of them
+
+  The cursor advances in whole sample intervals, so every sample is printed once
+  and always with the same time. Only samples the box took before the download
+  are counted, a page served again from the last result has none. None is
+  returned as count if there is no cursor yet.
+  """
+  if cursor is None:
+    return (None, fetched)
+  count = max(0, int((fetched - cursor) / interval))
+  return (count, cursor + count * interval)
+
+def get_samples(length: int, timing) -> list:
+  """Returns (index, time) of the samples of a series to print, the time is None if it is left to munin
+
+  :param timing: (number of new samples, time of the latest of them, seconds between two samples) or None.
+    Without new samples the latest one is printed.
+  """
+  if timing is None or not timing[0]:
+    return [(length - 1, None)]
+
+  count, latest, interval = timing
+  return [(length - 1 - age, int(latest - age * interval)) for age in reversed(range(min(count, length)))]
+
+def print_simple_series(data, name, graph, timing, stats, low=None, high=None):
+  """print the new values of first json data series, and the enabled statistics of the series"""
+  print_multi_series(data, [name], graph, timing, low, high)
+
+  series = parse_series(data['series'][0])
+  if low is not None or high is not None:
+    # like the last value, leave out measurements exceeding the limits
+    series = parse_series(v for v in series if (low is None or v > low) and (high is None or v < high))
+  print_stats_values(name, SeriesStats(series).toDict(stats))
+
+def print_multi_series(data, names, graph, timing, low=None, high=None):
+  """print the new values of multiple json data series, the samples of missed runs with their time"""
 
   print("multigraph " + graph)
   series = data['series']
   for i in range(len(names)):
     s = series[i]
     n = names[i]
-    val = s[-1] # last entry is latest measurement
-    if (low is None or float(val) > low) and (high is None or float(val) < high):
-      print(n + '.value ' + str(val))
-    else:
-      print("# " + str(val) + " exceeded limits " + str(low) + " - " + str(high))
-
-def print_system_stats():
-  """print the current system statistics"""
-
-  modes = get_modes()
-
-  # download the graphs
-  jsondata = FritzboxInterface().postPageWithLogin(PAGE, data=PARAMS)['data']
+    for index, sampled in get_samples(len(s), timing):
+      val = s[index]
+      if (low is None or float(val) > low) and (high is None or float(val) < high):
+        print(n + '.value ' + ('' if sampled is None else str(sampled) + ':') + str(val))
+      else:
+        print("# " + str(val) + " exceeded limits " + str(low) + " - " + str(high))
+
+def retrieve_system_stats(interface: FritzboxInterface, backfill: bool = None):
+  """download the graphs, the time of the download dates their samples
+
+  :param backfill: fetch the page from the box itself, as a cached response or a snapshot
+    of the collector is older than the time of the download, None reads env.ecostat_backfill
+  """
+  if backfill is None:
+    backfill = is_backfill_enabled(interface.config)
+  graphs = interface.postPageWithLogin(PAGE, data=PARAMS, paths=PATHS, direct=backfill)['data']
+  return {'time': time.time(), 'graphs': graphs}
+
+def print_system_stats(stats, config: FritzboxConfig = None, backfill: bool = None):
+  """print the system statistics sampled since the last run
+
+  :param backfill: print the samples of missed runs with their time, None reads env.ecostat_backfill.
+    Callers taking no past samples, e.g. the Prometheus exporter, must not advance the cursor of the plugin.
+  """
+
+  modes = get_modes(config)
+  enabledStats = get_stats('ecostat', config)
+  jsondata = stats['graphs']
+  timing = None
+  if backfill is None:
+    backfill = is_backfill_enabled(config)
+  if backfill:
+    # the time of the last sample printed, the following runs print the samples taken after it
+    state = FritzboxPluginState('ecostat', config)
+    cursor = state.load().get('cursor')
+    if cursor is not None and cursor > time.time():
+      # the clock went back, start over from the latest sample
+      cursor = None
+    # all graphs are sampled alike
+    interval = SERIES_PERIOD / len(jsondata['cpuutil']['series'][0])
+    count, latest = count_new_samples(stats['time'], cursor, interval)
+    timing = (count, latest, interval)
 
   if 'cpu' in modes:
     cpuload_data = jsondata['cpuutil']
-    print_simple_series(cpuload_data, 'load', 'cpuload')
+    print_simple_series(cpuload_data, 'load', 'cpuload', timing, enabledStats)
 
   if 'temp' in modes:
     cputemp_data = jsondata['cputemp']
-    print_simple_series(cputemp_data, 'temp', 'cputemp', low=0, high=120)
+    print_simple_series(cputemp_data, 'temp', 'cputemp', timing, enabledStats, low=0, high=120)
 
   if 'ram' in modes:
     ramusage_data = jsondata['ramusage']
-    print_multi_series(ramusage_data, RAMLABELS, 'ramusage')
+    print_multi_series(ramusage_data, RAMLABELS, 'ramusage', timing)
+
+  if timing is not None and latest != cursor:
+    state.save({'cursor': latest})
 
-def print_config():
-  modes = get_modes()
+def print_config(config: FritzboxConfig = None):
+  modes = get_modes(config)
 
   if 'cpu' in modes:
     print("multigraph cpuload")
@@ -84,6 +161,7 @@ def print_config():
     print("load.graph LINE1")
     print("load.min 0")
     print("load.info Fritzbox CPU usage")
+    print_stats_config('load', 'system', get_stats('ecostat', config))
 
   if 'temp' in modes:
     print("multigraph cputemp")
@@ -97,6 +175,7 @@ def print_config():
     print("temp.graph LINE1")
     print("temp.min 0")
     print("temp.info Fritzbox CPU temperature")
+    print_stats_config('temp', 'CPU temperature', get_stats('ecostat', config))
 
   if 'ram' in modes:
     print("multigraph ramusage")
@@ -117,8 +196,9 @@ if __name__ == "__main__":
     print_config()
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
-  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
     try:
-      print_system_stats()
+      print_system_stats(retrieve_revalidating('ecostat', lambda: retrieve_system_stats(FritzboxInterface())))
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox system stats: " + str(e))
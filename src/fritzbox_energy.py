@@ -24,10 +24,13 @@
 import os
 import re
 import sys
+from FritzboxConfig import FritzboxConfig, get_option
 from FritzboxInterface import FritzboxInterface
+from FritzboxRevalidate import retrieve_revalidating
 
 PAGE = 'data.lua'
 PARAMS = {'xhr':1, 'lang':'de', 'page':'energy', 'xhrId':'all', 'useajax':1, 'no_sidrenew':None}
+PATHS = [('data', 'drain')]
 DEVICES = ['system', 'cpu', 'wifi', 'dsl', 'ab', 'usb', 'lan']
 DEVICES_REPEATER = ['system', 'cpu', 'wifi', 'lan']
 HASPOWERSTATS = {'system':1, 'cpu':1, 'wifi':1, 'dsl':1, 'ab':1, 'usb':1, 'lan':0}
@@ -49,11 +52,11 @@ hourLoc = {"de": "Stunden", "en": "hours"}
 minutesLoc = {"de": "Minuten", "en": "minutes"}
 pattern = re.compile(patternLoc[locale])
 
-def get_modes():
-  return os.getenv('energy_modes').split(' ')
+def get_modes(config: FritzboxConfig = None):
+  return get_option('energy_modes', config).split(' ')
 
-def get_type():
-  return os.getenv('energy_product')
+def get_type(config: FritzboxConfig = None):
+  return get_option('energy_product', config)
 
 def get_devices_for(type):
   if type == "DSL":
@@ -62,14 +65,15 @@ def get_devices_for(type):
     return DEVICES_REPEATER
   raise Exception("No such type")
 
-def print_energy_stats():
-  """print the current energy statistics"""
+def retrieve_energy_stats(interface: FritzboxInterface):
+  """download the graphs"""
+  return interface.postPageWithLogin(PAGE, data=PARAMS, paths=PATHS)['data']['drain']
 
-  modes = get_modes()
-  type = get_type()
+def print_energy_stats(jsondata, config: FritzboxConfig = None):
+  """print the current energy statistics"""
 
-  # download the graphs
-  jsondata = FritzboxInterface().postPageWithLogin(PAGE, data=PARAMS)['data']['drain']
+  modes = get_modes(config)
+  type = get_type(config)
   devices = get_devices_for(type)
 
   if 'power' in modes:
@@ -112,9 +116,9 @@ def print_energy_stats():
       uptime = hours / 24
       print("uptime.value %.2f" % uptime)
 
-def print_config():
-  modes = get_modes()
-  type = get_type()
+def print_config(config: FritzboxConfig = None):
+  modes = get_modes(config)
+  type = get_type(config)
   devices = get_devices_for(type)
 
   if 'power' in modes:
@@ -168,8 +172,9 @@ if __name__ == "__main__":
     print_config()
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
-  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
     try:
-      print_energy_stats()
+      print_energy_stats(retrieve_revalidating('energy', lambda: retrieve_energy_stats(FritzboxInterface())))
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox energy stats: " + str(e))
@@ -13,6 +13,12 @@
   env.fritzbox_ip [ip address of the fritzbox]
   env.fritzbox_password [fritzbox password]
   env.fritzbox_user [fritzbox user, set any value if not required]
+  env.link_saturation_stats [min] [max] [p95] [p99] (optional statistics of the samples)
+
+  The transferred bytes of every QoS class are counted in the plugin state: each
+  run adds the samples the Fritzbox took since the previous run. The series only
+  reach back a few minutes, if the runs are further apart, the bytes of the time
+  the series don't cover are estimated from the average of the new samples.
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -23,41 +29,104 @@ import os
 import re
 import sys
 import json
+import time
+from FritzboxConfig import FritzboxConfig
 from FritzboxInterface import FritzboxInterface
+from FritzboxPluginState import FritzboxPluginState
+from FritzboxSeries import SeriesStats, get_stats, parse_series, print_stats_config, print_stats_values
 
 PAGE = 'data.lua'
 PARAMS = {'xhr':1, 'lang':'de', 'page':'netMoni', 'xhrId':'updateGraphs', 'useajax':1, 'no_sidrenew':None}
+PATHS = [('data', 'sync_groups'), ('data', 'sampling_interval')]
 
 DATA_UP   = ['us_realtime_bps_curr', 'us_important_bps_curr', 'us_default_bps_curr', 'us_background_bps_curr']
 LABELS_UP = ['realtime', 'high', 'default', 'low']
 DATA_DN   = ['ds_bps_curr', 'ds_mc_bps_curr']
 LABELS_DN = ['internet', 'iptv']
 
-def average_bps(datapoints):
-  avg = 0
-  for d in datapoints:
-    avg+=d
-  avg = avg//len(datapoints)
-  return avg
+# the interval of the boxes that don't give one on the page
+DEFAULT_INTERVAL = 5
+
+def get_interval(page: dict) -> float:
+  """returns the seconds between two samples, the page gives the milliseconds"""
+  return float(page.get('sampling_interval', DEFAULT_INTERVAL * 1000)) / 1000
+
+def count_new_samples(now: float, cursor: float, interval: float) -> tuple:
+  """Returns how many samples the Fritzbox took after the cursor and the cursor of the latest sample
+
+  The cursor advances in whole sample intervals, so a run starting a little earlier
+  or later than usual doesn't count a sample twice or skip one. None is returned as
+  count if there is no cursor yet.
+  """
+  # rounded to whole intervals, the cursor may be up to half an interval ahead of the clock
+  if cursor is None or cursor > now + interval:
+    # the first run, or the clock went back: start over from the current samples
+    return (None, now)
+  count = max(0, int((now - cursor) / interval + 0.5))
+  return (count, cursor + count * interval)
+
+def integrate_bytes(datapoints, count: int, interval: float) -> int:
+  """Returns the bytes transferred in the latest count samples of a series of bytes per second
+
+  :param count: the number of new samples, None for the whole series. If the series
+    holds fewer, the bytes of the missing ones are estimated from the average.
+  :param interval: the seconds between two samples
+  """
+  new = datapoints if count is None else datapoints[len(datapoints) - min(count, len(datapoints)):]
+  if not new:
+    return 0
+
+  total = sum(new) * interval
+  if count is not None and count > len(new):
+    total += (count - len(new)) * interval * sum(new) / len(new)
+  return int(total)
 
-def print_link_saturation():
-  """get the current DSL link saturation"""
+def count_bytes(jsondata, interval: float, now: float, config: FritzboxConfig = None) -> dict:
+  """adds the new samples to the byte counters in the plugin state of the box"""
+  state = FritzboxPluginState('link_saturation', config)
+  # runs of the plugin and of fritzbox_all may overlap, each sample is counted by one of them
+  with state.lock():
+    counters = state.load()
+    count, cursor = count_new_samples(now, counters.pop('cursor', None), interval)
 
-  jsondata = FritzboxInterface().postPageWithLogin(PAGE, data=PARAMS)["data"]["sync_groups"][0]
+    for data, field in zip(DATA_UP + DATA_DN, ['up_' + l for l in LABELS_UP] + ['dn_' + l for l in LABELS_DN]):
+      counters[field] = counters.get(field, 0) + integrate_bytes(jsondata[data], count, interval)
 
-  maxup = int(jsondata['upstream'])
-  maxdown = int(jsondata['downstream'])
+    state.save(dict(counters, cursor=cursor))
+  return counters
+
+def retrieve_link_saturation(interface: FritzboxInterface):
+  """download the graphs and count the bytes transferred since the last run"""
+  # the age of the samples is derived from the time of the download, so neither a cached response nor a
+  # snapshot of the collector will do
+  page = interface.postPageWithLogin(PAGE, data=PARAMS, paths=PATHS, direct=True)["data"]
+  now = time.time()
+  interval = get_interval(page)
+  jsondata = page["sync_groups"][0]
+  stats = {}
+  for data, field in zip(DATA_UP + DATA_DN, ['up_' + l for l in LABELS_UP] + ['dn_' + l for l in LABELS_DN]):
+    stats[field] = SeriesStats(parse_series(jsondata[data]))
+  return {'upstream': jsondata['upstream'], 'downstream': jsondata['downstream'], 'counters': count_bytes(jsondata, interval, now, interface.config), 'stats': stats}
+
+def print_link_saturation(data, config: FritzboxConfig = None):
+  """print the byte counters and the current DSL link capacity"""
+
+  maxup = int(data['upstream'])
+  maxdown = int(data['downstream'])
+  counters = data['counters']
 
   print("multigraph saturation_up")
-  for i in range(len(DATA_UP)):
-    print('up_' + LABELS_UP[i] + '.value ' + str(average_bps(jsondata[DATA_UP[i]])))
+  for l in LABELS_UP:
+    print('up_' + l + '.value ' + str(counters['up_' + l]))
+    print_stats_values('up_' + l, data['stats']['up_' + l].toDict(get_stats('link_saturation', config)))
   print("maxup.value " + str(maxup))
   print("multigraph saturation_down")
-  for i in range(len(DATA_DN)):
-    print('dn_' + LABELS_DN[i] + '.value ' + str(average_bps(jsondata[DATA_DN[i]])))
+  for l in LABELS_DN:
+    print('dn_' + l + '.value ' + str(counters['dn_' + l]))
+    print_stats_values('dn_' + l, data['stats']['dn_' + l].toDict(get_stats('link_saturation', config)))
   print("maxdown.value " + str(maxdown))
 
-def print_config():
+def print_config(config: FritzboxConfig = None):
   print("multigraph saturation_up")
   print("graph_title Uplink saturation")
   print("graph_vlabel bits out per ${graph_period}")
@@ -66,9 +135,12 @@ def print_config():
   print("graph_order " + ' '.join(LABELS_UP) + " maxdown")
   for l in LABELS_UP:
     print('up_' + l + '.label ' + l)
-    print('up_' + l + '.type GAUGE')
+    print('up_' + l + '.type DERIVE')
+    print('up_' + l + '.min 0')
     print('up_' + l + '.draw AREASTACK')
     print('up_' + l + '.cdef up_' + l + ',8,*')
+  for l in LABELS_UP:
+    print_stats_config('up_' + l, l, get_stats('link_saturation', config), 8)
   print("maxup.label MAX")
   print("maxup.type GAUGE")
   print("maxup.graph LINE1")
@@ -81,9 +153,12 @@ def print_config():
   print("graph_order " + ' '.join(LABELS_DN) + " maxup")
   for l in LABELS_DN:
     print('dn_' + l + '.label ' + l)
-    print('dn_' + l + '.type GAUGE')
+    print('dn_' + l + '.type DERIVE')
+    print('dn_' + l + '.min 0')
     print('dn_' + l + '.draw AREASTACK')
     print('dn_' + l + '.cdef dn_' + l + ',8,*')
+  for l in LABELS_DN:
+    print_stats_config('dn_' + l, l, get_stats('link_saturation', config), 8)
   print("maxdown.label MAX")
   print("maxdown.type GAUGE")
   print("maxdown.graph LINE1")
@@ -93,8 +168,9 @@ if __name__ == "__main__":
     print_config()
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
-  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
     try:
-      print_link_saturation()
+      print_link_saturation(retrieve_link_saturation(FritzboxInterface()))
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox link saturation: " + str(e))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+  fritzbox_scrape - A munin plugin for Linux to monitor the requests the
+  fritzbox_* plugins send to the AVM Fritzbox
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Add the following section to your munin-node's plugin configuration:
+
+  [fritzbox_*]
+  env.fritzbox_ip [ip address of the fritzbox]
+  env.fritzbox_password [fritzbox password]
+  env.fritzbox_user [fritzbox user, set any value if not required]
+
+  The plugin doesn't contact the Fritzbox itself, it graphs the timings and
+  counters the other plugins recorded per endpoint (see FritzboxScrapeStats):
+  requests, response sizes, the average time per request split into the time
+  to the first byte (including connect and TLS handshake of new connections),
+  transfer and parse, and logins, new connections, session probes, requests
+  retried after a 403 and hits and misses of the response cache. The average
+  times are taken over the requests since the previous run, which are
+  remembered in the plugin state.
+
+  This plugin supports the following munin configuration parameters:
+  #%# family=auto contrib
+  #%# capabilities=autoconf
+"""
+
+import os
+import sys
+from FritzboxInterface import FritzboxInterface
+from FritzboxPluginState import FritzboxPluginState
+from FritzboxScrapeStats import get_field_name
+
+PHASES = ['ttfb', 'transfer', 'parse']
+PHASE_LABELS = ['time to first byte', 'transfer', 'parse']
+SESSION_COUNTERS = ['logins', 'probes', 'retries', 'errors', 'connections', 'cache_hits', 'cache_misses']
+SESSION_LABELS = ['logins', 'session probes', 'retries after 403', 'failed requests', 'new connections', 'cache hits', 'cache misses']
+
+def average_ms(current: dict, previous: dict, total: str, count: str):
+  """returns the average in milliseconds of the requests since the previous run, or None without any"""
+  if previous is None:
+    return None
+  requests = current.get(count, 0) - previous.get(count, 0)
+  seconds = current.get(total, 0) - previous.get(total, 0)
+  if requests <= 0 or seconds < 0:
+    return None
+  return seconds / requests * 1000
+
+def retrieve_scrape_stats(interface: FritzboxInterface) -> dict:
+  """reads the recorded stats and computes the average times since the previous run"""
+  stats = interface.getScrapeStats()
+  state = FritzboxPluginState('scrape')
+  previous = state.load()
+  state.save(stats['endpoints'])
+
+  endpoints = {}
+  for endpoint, counters in sorted(stats['endpoints'].items()):
+    before = previous.get(endpoint)
+    if before is not None and counters.get('requests', 0) < before.get('requests', 0):
+      # the stats were reset
+      before = None
+    times = {phase: average_ms(counters, before, phase, 'parses' if phase == 'parse' else 'requests') for phase in PHASES}
+    durations = [times[phase] for phase in PHASES if phase != 'parse' and times[phase] is not None]
+    times['total'] = sum(durations) if durations else None
+    endpoints[endpoint] = {'counters': counters, 'times': times}
+
+  session = dict(stats['session'])
+  # new connections are counted for the session, older stats counted them per endpoint
+  for counter in ('retries', 'errors', 'connections'):
+    session[counter] = session.get(counter, 0) + sum(counters.get(counter, 0) for counters in stats['endpoints'].values())
+  return {'endpoints': endpoints, 'session': session}
+
+def format_ms(value) -> str:
+  return 'U' if value is None else str(round(value, 2))
+
+def print_scrape_stats(data: dict):
+  endpoints = data['endpoints']
+
+  print("multigraph scrape_requests")
+  for endpoint, values in endpoints.items():
+    print(get_field_name(endpoint) + '.value ' + str(int(values['counters'].get('requests', 0))))
+
+  print("multigraph scrape_bytes")
+  for endpoint, values in endpoints.items():
+    print(get_field_name(endpoint) + '.value ' + str(int(values['counters'].get('bytes', 0))))
+
+  print("multigraph scrape_time")
+  for endpoint, values in endpoints.items():
+    print(get_field_name(endpoint) + '.value ' + format_ms(values['times']['total']))
+  for endpoint, values in endpoints.items():
+    print("multigraph scrape_time." + get_field_name(endpoint))
+    for phase in PHASES:
+      print(phase + '.value ' + format_ms(values['times'][phase]))
+
+  print("multigraph scrape_session")
+  for counter in SESSION_COUNTERS:
+    print(counter + '.value ' + str(int(data['session'].get(counter, 0))))
+
+def print_config(data: dict):
+  endpoints = data['endpoints']
+
+  print("multigraph scrape_requests")
+  print("graph_title Fritzbox requests")
+  print("graph_vlabel requests per ${graph_period}")
+  print("graph_category network")
+  print("graph_args --base 1000 --lower-limit 0")
+  for endpoint in sorted(endpoints):
+    print(get_field_name(endpoint) + '.label ' + endpoint)
+    print(get_field_name(endpoint) + '.type DERIVE')
+    print(get_field_name(endpoint) + '.min 0')
+    print(get_field_name(endpoint) + '.draw AREASTACK')
+
+  print("multigraph scrape_bytes")
+  print("graph_title Fritzbox response size")
+  print("graph_vlabel bytes per ${graph_period}")
+  print("graph_category network")
+  print("graph_args --base 1024 --lower-limit 0")
+  for endpoint in sorted(endpoints):
+    print(get_field_name(endpoint) + '.label ' + endpoint)
+    print(get_field_name(endpoint) + '.type DERIVE')
+    print(get_field_name(endpoint) + '.min 0')
+    print(get_field_name(endpoint) + '.draw AREASTACK')
+
+  print("multigraph scrape_time")
+  print("graph_title Fritzbox request time")
+  print("graph_vlabel ms")
+  print("graph_category network")
+  print("graph_args --base 1000 --lower-limit 0")
+  print("graph_info Average time of the requests to an endpoint until the response was received")
+  for endpoint in sorted(endpoints):
+    print(get_field_name(endpoint) + '.label ' + endpoint)
+    print(get_field_name(endpoint) + '.type GAUGE')
+    print(get_field_name(endpoint) + '.draw LINE1')
+  for endpoint in sorted(endpoints):
+    print("multigraph scrape_time." + get_field_name(endpoint))
+    print("graph_title Fritzbox request time of " + endpoint)
+    print("graph_vlabel ms")
+    print("graph_category network")
+    print("graph_args --base 1000 --lower-limit 0")
+    print("graph_order " + ' '.join(PHASES))
+    for phase, label in zip(PHASES, PHASE_LABELS):
+      print(phase + '.label ' + label)
+      print(phase + '.type GAUGE')
+      print(phase + '.draw ' + ('LINE1' if phase == 'parse' else 'AREASTACK'))
+
+  print("multigraph scrape_session")
+  print("graph_title Fritzbox sessions")
+  print("graph_vlabel events per ${graph_period}")
+  print("graph_category network")
+  print("graph_args --base 1000 --lower-limit 0")
+  for counter, label in zip(SESSION_COUNTERS, SESSION_LABELS):
+    print(counter + '.label ' + label)
+    print(counter + '.type DERIVE')
+    print(counter + '.min 0')
+    print(counter + '.draw LINE1')
+
+if __name__ == "__main__":
+  if len(sys.argv) == 2 and sys.argv[1] == 'config':
+    # the config only needs the endpoints, the averages are left for the fetch
+    print_config({'endpoints': FritzboxInterface(useCollector=False).getScrapeStats()['endpoints']})
+  elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
+    print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
+    try:
+      print_scrape_stats(retrieve_scrape_stats(FritzboxInterface(useCollector=False)))
+    except Exception as e:
+      sys.exit("Couldn't retrieve fritzbox scrape stats: " + str(e))
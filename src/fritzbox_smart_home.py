@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+  fritzbox_smart_home - A munin plugin for Linux to monitor AVM Fritzbox SmartHome devices
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Add the following section to your munin-node's plugin configuration:
+
+  [fritzbox_*]
+  env.fritzbox_ip [ip address of the fritzbox]
+  env.fritzbox_password [fritzbox password]
+  env.fritzbox_user [fritzbox user, set any value if not required]
+  env.smart_home_modes [temperature] [humidity] [power] [energy] [battery] [window]
+
+  This plugin supports the following munin configuration parameters:
+  #%# family=auto contrib
+  #%# capabilities=autoconf
+
+  @see https://avm.de/fileadmin/user_upload/Global/Service/Schnittstellen/AHA-HTTP-Interface.pdf
+"""
+
+import os
+import sys
+from FritzboxConfig import FritzboxConfig, get_option
+from FritzboxInterface import FritzboxInterface
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxRevalidate import retrieve_revalidating
+from FritzboxSmartHome import retrieve_devices
+
+MODES = 'temperature humidity power energy battery window'
+# mode: (element, child element, factor, graph_title, graph_vlabel, graph_category, graph_args)
+GRAPHS = {
+  'temperature': ('temperature', 'celsius', 0.1, 'Smart Home temperature', 'degrees Celsius', 'sensors', None),
+  'humidity': ('humidity', 'rel_humidity', 1, 'Smart Home humidity', '%', 'sensors', '--lower-limit 0 --upper-limit 100'),
+  'power': ('powermeter', 'power', 0.001, 'Smart Home power', 'W', 'sensors', '--base 1000 --lower-limit 0'),
+  'energy': ('powermeter', 'energy', 0.001, 'Smart Home energy', 'kWh', 'sensors', '--base 1000 --lower-limit 0'),
+  'battery': ('battery', None, 1, 'Smart Home battery', '%', 'sensors', '--lower-limit 0 --upper-limit 100'),
+  'window': ('hkr', 'windowopenactiv', 1, 'Smart Home window open', 'open', 'sensors', '--lower-limit 0 --upper-limit 1'),
+}
+
+def get_modes(config: FritzboxConfig = None):
+  return get_option('smart_home_modes', config, MODES).split(' ')
+
+def get_value(device: dict, mode: str):
+  """returns the value of a device capability, None if the device lacks it and 'U' if it is unknown"""
+  element, child, factor = GRAPHS[mode][0:3]
+  if element not in device:
+    return None
+  value = device[element]
+  if child is not None:
+    if not isinstance(value, dict) or child not in value:
+      return None
+    value = value[child]
+  # devices which are not connected report empty values
+  if value == '' or (child is None and isinstance(value, dict)):
+    return 'U'
+  return round(float(value) * factor, 3)
+
+def get_graphs(devices: dict, config: FritzboxConfig = None) -> list:
+  """returns the enabled modes at least one device has the capability for"""
+  return [mode for mode in get_modes(config) if any(get_value(device, mode) is not None for device in devices.values())]
+
+def get_fingerprint(devices: dict) -> list:
+  """the ids of the devices, which the config lists"""
+  return sorted(devices)
+
+def retrieve_smart_home(interface: FritzboxInterface) -> dict:
+  """download the list of all smart home devices"""
+  return retrieve_devices(interface)
+
+def print_smart_home(devices: dict, config: FritzboxConfig = None):
+  """print the current values of all devices grouped by capability"""
+
+  for mode in get_graphs(devices, config):
+    print("multigraph smarthome_" + mode)
+    for device in devices.values():
+      value = get_value(device, mode)
+      if value is not None:
+        print("d{}.value {}".format(device['id'], value))
+
+def print_config(devices: dict, config: FritzboxConfig = None):
+  for mode in get_graphs(devices, config):
+    title, vlabel, category, args = GRAPHS[mode][3:7]
+    print("multigraph smarthome_" + mode)
+    print("graph_title " + title)
+    print("graph_vlabel " + vlabel)
+    print("graph_category " + category)
+    if args:
+      print("graph_args " + args)
+    print("graph_scale no")
+
+    for device in devices.values():
+      if get_value(device, mode) is None:
+        continue
+      print("d{}.label {}".format(device['id'], device['name']))
+      print("d{}.type GAUGE".format(device['id']))
+      print("d{}.graph LINE".format(device['id']))
+      print("d{}.info {} [{}]".format(device['id'], device['identifier'], device.get('productname', '')))
+
+if __name__ == "__main__":
+  # fetch the device list only once, config and (dirty config) fetch share it
+  devices = None
+  configCache = FritzboxConfigCache('smart_home', ['smart_home_modes'])
+  if len(sys.argv) == 2 and sys.argv[1] == 'config' and configCache.loadConfig() is not None:
+    print(configCache.loadConfig(), end='')
+  elif len(sys.argv) == 2 and sys.argv[1] == 'config':
+    try:
+      devices = retrieve_revalidating('smart_home', lambda: retrieve_smart_home(FritzboxInterface()))
+    except Exception as e:
+      sys.exit("Couldn't retrieve fritzbox smart home devices: " + str(e))
+    configCache.setFingerprint(get_fingerprint(devices))
+    configCache.printConfig(lambda: print_config(devices))
+  elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
+    print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
+    try:
+      if devices is None:
+        devices = retrieve_revalidating('smart_home', lambda: retrieve_smart_home(FritzboxInterface()))
+        configCache.setFingerprint(get_fingerprint(devices))
+      print_smart_home(devices)
+    except Exception as e:
+      sys.exit("Couldn't retrieve fritzbox smart home devices: " + str(e))
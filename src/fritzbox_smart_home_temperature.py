@@ -2,61 +2,78 @@
 """
   fritzbox_smart_home_temperature - A munin plugin for Linux to monitor AVM Fritzbox SmartHome temperatures
 
-  @see https://avm.de/fileadmin/user_upload/Global/Service/Schnittstellen/x_homeauto.pdf
+  Add the following section to your munin-node's plugin configuration:
+
+  [fritzbox_*]
+  env.fritzbox_ip [ip address of the fritzbox]
+  env.fritzbox_password [fritzbox password]
+  env.fritzbox_user [fritzbox user, set any value if not required]
+
+  This plugin supports the following munin configuration parameters:
+  #%# family=auto contrib
+  #%# capabilities=autoconf
+
+  @see https://avm.de/fileadmin/user_upload/Global/Service/Schnittstellen/AHA-HTTP-Interface.pdf
 """
 
 import os
-import re
 import sys
-from fritzconnection import FritzConnection
-from FritzboxConfig import FritzboxConfig
+from FritzboxInterface import FritzboxInterface
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxRevalidate import retrieve_revalidating
+from FritzboxSmartHome import retrieve_devices
 
-def printSmartHomeTemperature():
-  """get the current cpu temperature"""
+def printSmartHomeTemperature(smartHomeData):
+  """print the current smart home temperatures"""
 
-  for data in retrieveSmartHomeTemps():
-    print ("t{}.value {}".format(data['NewDeviceId'],float(data['NewTemperatureCelsius']) / 10))
+  for data in smartHomeData.values():
+    celsius = data['temperature'].get('celsius')
+    # devices which are not connected report no temperature
+    value = float(celsius) / 10 if celsius else 'U'
+    print ("t{}.value {}".format(data['id'], value))
 
-def printConfig():
+def printConfig(smartHomeData):
   print("graph_title Smart Home temperature")
   print("graph_vlabel degrees Celsius")
   print("graph_category sensors")
   print("graph_scale no")
 
-  for data in retrieveSmartHomeTemps():
-    print ("t{}.label {}".format(data['NewDeviceId'],data['NewDeviceName']))
-    print ("t{}.type GAUGE".format(data['NewDeviceId']))
-    print ("t{}.graph LINE".format(data['NewDeviceId']))
-    print ("t{}.info Temperature [{}]".format(data['NewDeviceId'],data['NewProductName']))
+  for data in smartHomeData.values():
+    print ("t{}.label {}".format(data['id'], data['name']))
+    print ("t{}.type GAUGE".format(data['id']))
+    print ("t{}.graph LINE".format(data['id']))
+    print ("t{}.info Temperature [{}]".format(data['id'], data['productname']))
 
-def retrieveSmartHomeTemps():
-  smartHomeData = []
-  config = FritzboxConfig()
+def getFingerprint(smartHomeData):
+  """the AINs of the devices, which the config lists"""
+  return sorted(smartHomeData)
 
-  try:
-    connection = FritzConnection(address=config.server, user=config.user, password=config.password, use_tls=config.useTls)
-  except Exception as e:
-    sys.exit("Couldn't get temperature: " + str(e))
+def retrieveSmartHomeTemps(interface: FritzboxInterface):
+  """returns the devices with a temperature sensor keyed by their AIN"""
+  devices = retrieve_devices(interface)
+  return {ain: device for ain, device in devices.items() if 'temperature' in device}
 
-  for i in range(0, 20):
+if __name__ == '__main__':
+  # walk the devices only once, config and (dirty config) fetch share the result
+  smartHomeData = None
+  configCache = FritzboxConfigCache('smart_home_temperature')
+  if len(sys.argv) == 2 and sys.argv[1] == 'config' and configCache.loadConfig() is not None:
+    print(configCache.loadConfig(), end='')
+  elif len(sys.argv) == 2 and sys.argv[1] == 'config':
     try:
-      data = connection.call_action('X_AVM-DE_Homeauto1', 'GetGenericDeviceInfos', arguments={'NewIndex': i})
-      if (data['NewTemperatureIsEnabled']):
-        smartHomeData.append(data)
+      smartHomeData = retrieve_revalidating('smart_home_temperature', lambda: retrieveSmartHomeTemps(FritzboxInterface()))
     except Exception as e:
-      # smart home device index does not exist, so we stop here
-      break
-
-  return smartHomeData
-
-if __name__ == '__main__':
-  if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    printConfig()
+      sys.exit("Couldn't retrieve fritzbox smarthome temperatures: " + str(e))
+    configCache.setFingerprint(getFingerprint(smartHomeData))
+    configCache.printConfig(lambda: printConfig(smartHomeData))
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print('yes')
-  elif len(sys.argv) == 1 or len(sys.argv) == 2 and sys.argv[1] == 'fetch':
-    # Some docs say it'll be called with fetch, some say no arg at all
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
     try:
-      printSmartHomeTemperature()
+      if smartHomeData is None:
+        smartHomeData = retrieve_revalidating('smart_home_temperature', lambda: retrieveSmartHomeTemps(FritzboxInterface()))
+        configCache.setFingerprint(getFingerprint(smartHomeData))
+      printSmartHomeTemperature(smartHomeData)
     except Exception as e:
-      sys.exit("Couldn't retrieve fritzbox smarthome temperatures: " + str(e))
\ No newline at end of file
+      sys.exit("Couldn't retrieve fritzbox smarthome temperatures: " + str(e))
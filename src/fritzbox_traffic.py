@@ -5,8 +5,6 @@
   Author: Christian Stade-Schuldt
   Like Munin, this plugin is licensed under the GNU GPL v2 license
   http://www.opensource.org/licenses/GPL-2.0
-  This plugin requires the fritzconnection plugin. To install it using pip:
-  pip install fritzconnection
 
   Add the following section to your munin-node's plugin configuration:
 
@@ -21,30 +19,51 @@
 
 import os
 import sys
-from fritzconnection.lib.fritzstatus import FritzStatus
-from fritzconnection.core.exceptions import FritzConnectionException
-from FritzboxConfig import FritzboxConfig
+from FritzboxConfig import FritzboxConfig, get_option
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxTR064 import FritzboxTR064
 
 class FritzboxTraffic:
-  def __init__(self):
-    config = FritzboxConfig()
-    try:
-      self.__connection = FritzStatus(address=config.server, user=config.user, password=config.password, use_tls=config.useTls)
-    except FritzConnectionException as connection_exception:
-      sys.exit("Couldn't get WAN traffic: " + str(connection_exception))
+  __maxBitRate = None
+
+  def __init__(self, config: FritzboxConfig = None, connection: FritzboxTR064 = None):
+    """
+    :param connection: the TR-064 client of the box, e.g. shared with other plugins, a new one if None
+    """
+    self.__config = config
+    self.__connection = connection if connection is not None else FritzboxTR064(config)
+
+  def retrieveTraffic(self):
+    rates = self.__connection.callAction('WANCommonIFC1', 'GetAddonInfos')
+    return {'transmission_rate': (rates['NewByteSendRate'], rates['NewByteReceiveRate']), 'max_bit_rate': self.__getMaxBitRate()}
 
-  def printTraffic(self):
-    transmission_rate = self.__connection.transmission_rate
+  def printTraffic(self, traffic):
+    transmission_rate = traffic['transmission_rate']
     print('down.value %d' % transmission_rate[1])
     print('up.value %d' % transmission_rate[0])
 
-    if not os.environ.get('traffic_remove_max') or "false" in os.environ.get('traffic_remove_max'):
-      max_traffic = self.__connection.max_bit_rate
+    if self.__showMax():
+      max_traffic = traffic['max_bit_rate']
       print('maxdown.value %d' % max_traffic[1])
       print('maxup.value %d' % max_traffic[0])
 
+  def getFingerprint(self, traffic):
+    """the maximum bit rates, which are the limits of the config"""
+    return traffic['max_bit_rate']
+
+  def __getMaxBitRate(self):
+    # queried once, config and (dirty config) fetch share it
+    if self.__maxBitRate is None:
+      properties = self.__connection.callAction('WANCommonIFC1', 'GetCommonLinkProperties')
+      self.__maxBitRate = (properties['NewLayer1UpstreamMaxBitRate'], properties['NewLayer1DownstreamMaxBitRate'])
+    return self.__maxBitRate
+
+  def __showMax(self):
+    removeMax = get_option('traffic_remove_max', self.__config)
+    return not removeMax or "false" in removeMax
+
   def printConfig(self):
-    max_traffic = self.__connection.max_bit_rate
+    max_traffic = self.__getMaxBitRate()
 
     print("graph_title WAN traffic")
     print("graph_args --base 1000")
@@ -65,7 +84,7 @@ class FritzboxTraffic:
     print(f"up.max %d{max_traffic[0]}")
     print("up.negative down")
     print("up.info Traffic of the WAN interface.")
-    if not os.environ.get('traffic_remove_max') or "false" in os.environ.get('traffic_remove_max'):
+    if self.__showMax():
       print("maxdown.label received")
       print("maxdown.type GAUGE")
       print("maxdown.graph no")
@@ -76,13 +95,21 @@ class FritzboxTraffic:
       print("maxup.info Maximum speed of the WAN interface.")
 
 if __name__ == "__main__":
+  if len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
+    print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
+    sys.exit(0)
   traffic = FritzboxTraffic()
+  configCache = FritzboxConfigCache('traffic', ['traffic_remove_max'])
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    traffic.printConfig()
-  elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
-    print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
-  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
     try:
-      traffic.printTraffic()
+      configCache.printConfig(traffic.printConfig)
+    except Exception as e:
+      sys.exit("Couldn't get WAN traffic: " + str(e))
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
+    try:
+      values = traffic.retrieveTraffic()
+      configCache.setFingerprint(traffic.getFingerprint(values))
+      traffic.printTraffic(values)
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox traffic: " + str(e))
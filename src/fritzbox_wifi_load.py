@@ -15,6 +15,7 @@
   env.fritzbox_user [fritzbox user, set any value if not required]
   env.wifi_freqs [24] [5]
   env.wifi_modes [freqs] [neighbors]
+  env.wifi_stats [min] [max] [p95] [p99] (optional statistics of the bandwidth usage)
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -23,40 +24,30 @@
 
 import os
 import sys
+from FritzboxConfig import FritzboxConfig, get_option
 from FritzboxInterface import FritzboxInterface
+from FritzboxRevalidate import retrieve_revalidating
+from FritzboxSeries import SeriesStats, get_stats, parse_pair_series, print_stats_config, print_stats_values
 
 PAGE = 'data.lua'
 PARAMS = {'xhr':1, 'lang':'de', 'page':'chan', 'xhrId':'environment', 'useajax':1, 'no_sidrenew':None}
 
-def average_load(datapoints):
-  """ average send and receive series """
-  recv = 0
-  send = 0
-  for d in datapoints:
-    parts = d.split(u':')
-    recv += int(parts[0])
-    send += int(parts[1])
-  datalen = len(datapoints)
-  recv //= datalen
-  send //= datalen
-  return (recv,send)
+def get_freqs(config: FritzboxConfig = None):
+  return get_option('wifi_freqs', config).split(' ')
 
-def get_freqs():
-  return os.getenv('wifi_freqs').split(' ')
+def get_modes(config: FritzboxConfig = None):
+  return get_option('wifi_modes', config).split(' ')
 
-def get_modes():
-  return os.getenv('wifi_modes').split(' ')
+def retrieve_wifi_load(interface: FritzboxInterface):
+  """download the graphs (the 10-minute view)"""
+  return interface.postPageWithLogin(PAGE, data=PARAMS)['data']
 
-def print_wifi_load():
-  """get the current wifi bandwidth usage"""
+def print_wifi_load(jsondata, config: FritzboxConfig = None):
+  """print the current wifi bandwidth usage"""
 
-  # set up the graphs (load the 10-minute view)
-  fritzboxHelper = FritzboxInterface()
-  # download the graphs
-  jsondata = fritzboxHelper.postPageWithLogin(PAGE, data=PARAMS)['data']
-
-  freqs = get_freqs()
-  modes = get_modes()
+  freqs = get_freqs(config)
+  modes = get_modes(config)
+  stats = get_stats('wifi', config)
   scanlist = jsondata['scanlist']
 
   # parse data from all available frequencies
@@ -68,10 +59,12 @@ def print_wifi_load():
     if 'freqs' in modes:
       airtimedata = freqdata['airtimedata']
       datapoints = airtimedata.split(',')[3:303]
-      average_recv, average_send = average_load(datapoints)
+      recv, send = [SeriesStats(series) for series in parse_pair_series(datapoints)]
       print('multigraph bandwidth_' + freq + 'ghz')
-      print(freq + 'ghz_recv.value ' + str(average_recv))
-      print(freq + 'ghz_send.value ' + str(average_send))
+      print(freq + 'ghz_recv.value ' + str(int(recv.avg)))
+      print(freq + 'ghz_send.value ' + str(int(send.avg)))
+      print_stats_values(freq + 'ghz_recv', recv.toDict(stats))
+      print_stats_values(freq + 'ghz_send', send.toDict(stats))
     if 'neighbors' in modes:
       own_chans = freqdata['usedChannels']
       sameChan = 0
@@ -90,9 +83,10 @@ def print_wifi_load():
       print(freq + 'ghz_samechan.value ' + str(sameChan))
       print(freq + 'ghz_otherchans.value ' + str(otherChans))
 
-def print_config():
-  freqs = get_freqs()
-  modes = get_modes()
+def print_config(config: FritzboxConfig = None):
+  freqs = get_freqs(config)
+  modes = get_modes(config)
+  stats = get_stats('wifi', config)
   for freq in freqs:
     if 'freqs' in modes:
       print("multigraph bandwidth_" + freq + 'ghz')
@@ -106,6 +100,8 @@ def print_config():
         print(multiP + '.label ' + l)
         print(multiP + '.type GAUGE')
         print(multiP + '.draw AREASTACK')
+      for p,l in {'recv' : 'receive', 'send': 'send'}.items():
+        print_stats_config(freq + 'ghz_' + p, l, stats)
     if 'neighbors' in modes:
       print("multigraph neighbors_" + freq + 'ghz')
       print("graph_title WIFI " + freq + "GHz neighbor APs")
@@ -124,8 +120,9 @@ if __name__ == "__main__":
     print_config()
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
-  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+  # with dirtyconfig munin-node accepts the values right after the config, saving a second run
+  if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch') or (len(sys.argv) == 2 and sys.argv[1] == 'config' and os.getenv('MUNIN_CAP_DIRTYCONFIG') == '1'):
     try:
-      print_wifi_load()
+      print_wifi_load(retrieve_revalidating('wifi_load', lambda: retrieve_wifi_load(FritzboxInterface())))
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox wifi load: " + str(e))
@@ -0,0 +1,23 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/../src')
+from FritzboxConfig import FritzboxConfig
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__)) + '/../benchmark/fixtures'
+
+def read_fixture(name: str) -> bytes:
+  with open(FIXTURE_DIR + '/' + name, 'rb') as fixture:
+    return fixture.read()
+
+@pytest.fixture
+def plugstate(tmp_path, monkeypatch):
+  """keeps the plugin state of a test in its temporary directory"""
+  monkeypatch.setenv('MUNIN_PLUGSTATE', str(tmp_path))
+  return tmp_path
+
+@pytest.fixture
+def config(plugstate):
+  """the config of the default box, keeping its state in the temporary directory of the test"""
+  return FritzboxConfig()
@@ -0,0 +1,16 @@
+import socket
+import time
+from FritzboxCollectorClient import FritzboxCollectorClient
+
+def test_request_waits_for_the_given_timeout(tmp_path):
+  path = str(tmp_path / 'collector.sock')
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+    # a collector that accepts the request but never answers
+    server.bind(path)
+    server.listen(1)
+    start = time.monotonic()
+    assert FritzboxCollectorClient(path, 'box').request('GET', '/page', {}, 0.2) is None
+    assert time.monotonic() - start < 2
+
+def test_request_without_a_collector(tmp_path):
+  assert FritzboxCollectorClient(str(tmp_path / 'collector.sock'), 'box').request('GET', '/page', {}, 1) is None
@@ -0,0 +1,80 @@
+import time
+import pytest
+import FritzboxConfigCache as configCacheModule
+from FritzboxConfig import FritzboxConfig
+from FritzboxConfigCache import FritzboxConfigCache
+
+@pytest.fixture(autouse=True)
+def modes(monkeypatch):
+  monkeypatch.setenv('test_modes', 'a b')
+
+class PrintConfig:
+  """prints a config and counts how often it was asked to"""
+
+  def __init__(self, text: str = 'graph_title Test\n'):
+    self.text = text
+    self.calls = 0
+
+  def __call__(self):
+    self.calls += 1
+    print(self.text, end='')
+
+def run(config: FritzboxConfig, printConfig: PrintConfig, fingerprint, options: list = None) -> FritzboxConfigCache:
+  """a fetch run recording the fingerprint followed by a config run"""
+  FritzboxConfigCache('test', options, config).setFingerprint(fingerprint)
+  configCache = FritzboxConfigCache('test', options, config)
+  configCache.printConfig(printConfig)
+  return configCache
+
+def test_keeps_the_config(config, capsys):
+  printConfig = PrintConfig()
+  run(config, printConfig, [1, 2])
+  run(config, printConfig, [1, 2])
+  assert printConfig.calls == 1
+  assert capsys.readouterr().out == 'graph_title Test\n' * 2
+
+def test_default_options_are_not_shared(config):
+  first = FritzboxConfigCache('test', config=config)
+  second = FritzboxConfigCache('test', config=config)
+  assert first.loadConfig() is None and second.loadConfig() is None
+
+def test_fingerprint_change(config):
+  printConfig = PrintConfig()
+  run(config, printConfig, [1, 2])
+  run(config, printConfig, [1, 2])
+  run(config, printConfig, [1, 3])
+  run(config, printConfig, [1, 3])
+  assert printConfig.calls == 2
+
+def test_options_change(config, monkeypatch):
+  printConfig = PrintConfig()
+  run(config, printConfig, None, ['test_modes'])
+  monkeypatch.setenv('test_modes', 'a')
+  run(config, printConfig, None, ['test_modes'])
+  assert printConfig.calls == 2
+
+def test_options_of_a_target(config, monkeypatch):
+  monkeypatch.setenv('box_test_modes', 'a')
+  target = FritzboxConfig('box')
+  printConfig = PrintConfig()
+  run(config, printConfig, None, ['test_modes'])
+  # the same box with other options keeps a config of its own
+  run(target, printConfig, None, ['test_modes'])
+  assert printConfig.calls == 2
+
+def test_max_age(config, monkeypatch):
+  printConfig = PrintConfig()
+  run(config, printConfig, None)
+  now = time.time()
+  monkeypatch.setattr(time, 'time', lambda: now + configCacheModule.MAX_AGE + 1)
+  run(config, printConfig, None)
+  assert printConfig.calls == 2
+
+def test_failed_config_is_not_kept(config, capsys):
+  def fail():
+    print('partial')
+    raise RuntimeError('login failed')
+  with pytest.raises(RuntimeError):
+    FritzboxConfigCache('test', None, config).printConfig(fail)
+  assert capsys.readouterr().out == 'partial\n'
+  assert FritzboxConfigCache('test', None, config).loadConfig() is None
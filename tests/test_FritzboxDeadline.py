@@ -0,0 +1,61 @@
+import threading
+import pytest
+from FritzboxConfig import FritzboxConfig
+from FritzboxDeadline import CONNECT_TIMEOUT, get_timeouts, start_run
+from FritzboxExceptions import FritzboxTimeoutError
+from FritzboxFileSession import FritzboxFileSession
+
+def make_config(server: str, timeout: float) -> FritzboxConfig:
+  config = FritzboxConfig()
+  config.server = server
+  config.timeout = timeout
+  return config
+
+def test_get_timeouts_limits_the_connect_timeout():
+  config = make_config('timeouts.box', 20)
+  start_run(config)
+  connect, read = get_timeouts(config)
+  assert connect == CONNECT_TIMEOUT
+  assert 19 < read <= 20
+
+def test_get_timeouts_without_time_left():
+  config = make_config('expired.box', 0)
+  start_run(config)
+  with pytest.raises(FritzboxTimeoutError):
+    get_timeouts(config)
+
+def test_boxes_have_a_deadline_each():
+  expired = make_config('first.box', 0)
+  other = make_config('second.box', 8)
+  start_run(expired)
+  start_run(other)
+  with pytest.raises(FritzboxTimeoutError):
+    get_timeouts(expired)
+  assert get_timeouts(other)[1] > 7
+
+def test_start_run_renews_the_deadline():
+  config = make_config('renewed.box', 0)
+  start_run(config)
+  config.timeout = 8
+  start_run(config)
+  assert get_timeouts(config)[1] > 7
+
+def test_count_failure_counts_concurrent_failures(plugstate):
+  session = FritzboxFileSession('fritz.box', 'user', None)
+  threads = [threading.Thread(target=session.countFailure, args=(20, 60)) for i in range(10)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert session.loadRetryTime() == 0
+  session.countFailure(11, 60)
+  assert session.loadRetryTime() == 60
+
+def test_clear_failures(plugstate):
+  session = FritzboxFileSession('fritz.box', 'user', None)
+  session.clearFailures()
+  session.countFailure(1, 60)
+  assert session.loadRetryTime() == 60
+  session.clearFailures()
+  assert session.loadRetryTime() == 0
+  assert not (plugstate / 'fritzbox' / 'fritz.box__None__user.down').exists()
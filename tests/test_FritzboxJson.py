@@ -0,0 +1,39 @@
+import json
+import pytest
+import FritzboxJson
+from FritzboxJson import extract, get_wanted
+from conftest import read_fixture
+
+PAGE = b'{"pid": "ecoStat", "data": {"cpuutil": {"series": [[1, 2]]}, "cputemp": {"series": [[40]]}, "list": [1], "name": "x"}}'
+
+@pytest.fixture(params=['json', 'orjson'])
+def backend(request, monkeypatch):
+  if request.param == 'json':
+    monkeypatch.setattr(FritzboxJson, 'orjson', None)
+  elif FritzboxJson.orjson is None:
+    pytest.skip('orjson is not installed')
+
+def test_get_wanted():
+  assert get_wanted([('data', 'cpuutil'), ('data', 'cputemp')]) == {'data': {'cpuutil': None, 'cputemp': None}}
+  # an enclosing value is kept as a whole
+  assert get_wanted([('data',), ('data', 'cpuutil')]) == {'data': None}
+
+def test_extract(backend):
+  assert extract(PAGE, [('data', 'cpuutil'), ('pid',)]) == {'data': {'cpuutil': {'series': [[1, 2]]}}, 'pid': 'ecoStat'}
+  assert extract(PAGE.decode(), [('data', 'cputemp')]) == {'data': {'cputemp': {'series': [[40]]}}}
+
+def test_extract_missing_paths(backend):
+  # a missing key and a path through something else than an object are left out
+  assert extract(PAGE, [('data', 'missing'), ('data', 'list', 'item'), ('data', 'name', 'item')]) == {'data': {}}
+
+def test_extract_recorded_page(backend):
+  content = read_fixture('data.lua_ecoStat')
+  paths = [('data', 'cpuutil'), ('data', 'ramusage')]
+  page = json.loads(content)
+  assert extract(content, paths) == {'data': {'cpuutil': page['data']['cpuutil'], 'ramusage': page['data']['ramusage']}}
+
+def test_extract_no_object(backend):
+  with pytest.raises(json.JSONDecodeError):
+    extract(b'[1, 2]', [('data',)])
+  with pytest.raises(json.JSONDecodeError):
+    extract(b'<html>', [('data',)])
@@ -0,0 +1,66 @@
+import os
+import time
+import pytest
+from FritzboxConfig import FritzboxConfig
+from FritzboxPluginState import FritzboxPluginState
+from FritzboxRevalidate import retrieve_revalidating
+
+@pytest.fixture
+def config(config):
+  config.maxStaleness = 600
+  config.staleThreshold = 0.5
+  return config
+
+def save_last(config: FritzboxConfig, result):
+  state = FritzboxPluginState('test_last', config)
+  state.save({'time': time.time(), 'result': result})
+  return state
+
+def wait_for(predicate, timeout: float = 5):
+  deadline = time.monotonic() + timeout
+  while not predicate():
+    assert time.monotonic() < deadline
+    time.sleep(0.05)
+
+def test_waits_without_a_last_result(config):
+  assert retrieve_revalidating('test', lambda: {'value': 1}, config) == {'value': 1}
+  assert FritzboxPluginState('test_last', config).load()['result'] == {'value': 1}
+
+def test_disabled(config):
+  config.maxStaleness = 0
+  assert retrieve_revalidating('test', lambda: {'value': 1}, config) == {'value': 1}
+  assert FritzboxPluginState('test_last', config).load() == {}
+
+def test_fast_fetch(config):
+  save_last(config, {'value': 1})
+  assert retrieve_revalidating('test', lambda: {'value': 2}, config) == {'value': 2}
+
+def test_slow_fetch_serves_the_last_result(config):
+  def retrieve():
+    time.sleep(1)
+    return {'value': 2}
+  state = save_last(config, {'value': 1})
+  assert retrieve_revalidating('test', retrieve, config) == {'value': 1}
+  # the next run gets the result of the fetch continuing in the background
+  wait_for(lambda: state.load()['result'] == {'value': 2})
+
+def test_one_fetch_at_a_time(config, tmp_path):
+  started = tmp_path / 'started'
+  def retrieve():
+    with open(started, 'a') as marker:
+      marker.write('x')
+    time.sleep(1)
+    return {'value': 2}
+  state = save_last(config, {'value': 1})
+  assert retrieve_revalidating('test', retrieve, config) == {'value': 1}
+  assert retrieve_revalidating('test', retrieve, config) == {'value': 1}
+  wait_for(lambda: state.load()['result'] == {'value': 2})
+  assert started.read_text() == 'x'
+
+def test_failed_fetch_is_logged(config):
+  def retrieve():
+    raise RuntimeError('box unreachable')
+  state = save_last(config, {'value': 1})
+  assert retrieve_revalidating('test', retrieve, config) == {'value': 1}
+  log = state.getFilename('log')
+  wait_for(lambda: os.path.exists(log) and 'box unreachable' in open(log).read())
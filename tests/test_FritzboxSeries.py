@@ -0,0 +1,11 @@
+from FritzboxSeries import parse_pair_series
+
+def test_parse_pair_series():
+  recv, send = parse_pair_series(['1:2', '3:4', '5.5:6'])
+  assert list(recv) == [1, 3, 5.5]
+  assert list(send) == [2, 4, 6]
+
+def test_parse_pair_series_skips_malformed_points():
+  recv, send = parse_pair_series(['1:2', '3', '4:5:6', 'x:7', '8:9'])
+  assert list(recv) == [1, 8]
+  assert list(send) == [2, 9]
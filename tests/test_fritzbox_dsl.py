@@ -0,0 +1,64 @@
+import pytest
+from conftest import read_fixture
+from FritzboxExceptions import FritzboxResponseError
+from fritzbox_dsl import LABELS, read_tables
+
+def read_page() -> str:
+  return read_fixture('internet_dsl_stats_tab.lua').decode('utf-8')
+
+def get_row(page: str, label: str) -> str:
+  start = page.index('<tr><td>' + label + '</td>')
+  return page[start:page.index('</tr>', start) + len('</tr>')]
+
+def test_read_tables_returns_every_row():
+  stats = read_tables(read_fixture('internet_dsl_stats_tab.lua'))
+
+  assert set(stats) == set(LABELS['de'].values())
+  assert stats['capacity'] == ('247561', '46938')
+  assert stats['rate'] == ('236886', '46719')
+  assert stats['snr'] == ('8', '9')
+  assert stats['damping'] == ('14', '12')
+  assert stats['es'] == ('21', '118')
+  assert stats['ses'] == ('3', '7')
+
+def test_read_tables_reads_the_per_minute_rows():
+  stats = read_tables(read_fixture('internet_dsl_stats_tab.lua'))
+
+  # not the rows of the last 15 minutes or the totals following them
+  assert stats['crc'] == ('0.02', '0.00')
+  assert stats['corr'] == ('31.87', '0.41')
+  assert stats['fail'] == ('0.01', '0.00')
+
+def test_read_tables_accepts_str():
+  page = read_fixture('internet_dsl_stats_tab.lua')
+
+  assert read_tables(page.decode('utf-8')) == read_tables(page)
+
+def test_read_tables_finds_reordered_rows():
+  page = read_page()
+  expected = read_tables(page)
+  capacity = get_row(page, 'Leitungskapazität')
+  snr = get_row(page, 'Störabstandsmarge')
+  crc = get_row(page, 'CRC-Fehler pro Minute')
+  # swap two rows, move one to the end of its table and add one before them
+  page = page.replace(capacity, '\0').replace(snr, capacity).replace('\0', snr)
+  head, tail = page.replace(crc, '').rsplit('</table>', 1)
+  page = head + crc + '</table>' + tail
+  page = page.replace('<tr><td>DSLAM-Datenrate Max.', '<tr><td>Neu</td><td></td><td>1</td><td>2</td></tr><tr><td>DSLAM-Datenrate Max.')
+  assert page.index('Störabstandsmarge') < page.index('Leitungskapazität')
+
+  assert read_tables(page) == expected
+
+def test_read_tables_english():
+  page = read_page()
+  for german, name in LABELS['de'].items():
+    english = next(label for label, englishName in LABELS['en'].items() if englishName == name)
+    page = page.replace('<td>' + german + '</td>', '<td>' + english + '</td>')
+
+  assert read_tables(page, 'en') == read_tables(read_page())
+
+def test_read_tables_raises_on_missing_rows():
+  page = read_page()
+
+  with pytest.raises(FritzboxResponseError, match='Nicht korrigierbare Fehler pro Minute'):
+    read_tables(page.replace(get_row(page, 'Nicht korrigierbare Fehler pro Minute'), ''))
@@ -0,0 +1,57 @@
+import json
+import pytest
+from FritzboxConfig import FritzboxConfig
+from conftest import read_fixture
+from fritzbox_ecostat import count_new_samples, get_samples, print_system_stats
+
+def test_count_new_samples_first_run():
+  assert count_new_samples(1000.0, None, 480) == (None, 1000.0)
+
+def test_count_new_samples_advances_in_whole_intervals():
+  assert count_new_samples(1000.0 + 3 * 480 + 100, 1000.0, 480) == (3, 1000.0 + 3 * 480)
+  # a sample is counted once the box took it
+  assert count_new_samples(1479.0, 1000.0, 480) == (0, 1000.0)
+  assert count_new_samples(1480.0, 1000.0, 480) == (1, 1480.0)
+
+def test_count_new_samples_older_page():
+  # e.g. the last result served again while the box is slow
+  assert count_new_samples(900.0, 1000.0, 480) == (0, 1000.0)
+
+def test_get_samples_latest_only():
+  assert get_samples(180, None) == [(179, None)]
+  assert get_samples(180, (None, 1000.0, 480)) == [(179, None)]
+  assert get_samples(180, (0, 1000.0, 480)) == [(179, None)]
+
+def test_get_samples_new_samples():
+  assert get_samples(180, (3, 2000.0, 480)) == [(177, 1040), (178, 1520), (179, 2000)]
+
+def test_get_samples_gap_longer_than_the_series():
+  samples = get_samples(180, (500, 100000.0, 480))
+  assert len(samples) == 180
+  assert samples[0] == (0, 100000 - 179 * 480)
+  assert samples[-1] == (179, 100000)
+
+@pytest.fixture(autouse=True)
+def modes(monkeypatch):
+  monkeypatch.setenv('ecostat_modes', 'cpu')
+
+def print_load(capsys, config: FritzboxConfig, fetched: float, backfill: bool = None) -> list:
+  graphs = json.loads(read_fixture('data.lua_ecoStat'))['data']
+  print_system_stats({'time': fetched, 'graphs': graphs}, config, backfill)
+  return [line for line in capsys.readouterr().out.splitlines() if line.startswith('load.value')]
+
+def test_print_system_stats_backfills_once(config, capsys):
+  # the fixture has 180 samples, one per 480 seconds
+  start = 1e9
+  latest = json.loads(read_fixture('data.lua_ecoStat'))['data']['cpuutil']['series'][0][-1]
+  assert print_load(capsys, config, start) == ['load.value ' + str(latest)]
+  assert len(print_load(capsys, config, start + 2 * 480 + 10)) == 2
+  lines = print_load(capsys, config, start + 3 * 480 + 10)
+  assert lines == ['load.value ' + str(int(start + 3 * 480)) + ':' + str(latest)]
+  # no new sample, the latest value is printed for the time of the run
+  assert print_load(capsys, config, start + 3 * 480 + 20) == ['load.value ' + str(latest)]
+
+def test_print_system_stats_without_backfill(config, capsys):
+  latest = json.loads(read_fixture('data.lua_ecoStat'))['data']['cpuutil']['series'][0][-1]
+  assert print_load(capsys, config, 1e9, False) == ['load.value ' + str(latest)]
+  assert print_load(capsys, config, 1e9 + 2 * 480, False) == ['load.value ' + str(latest)]
@@ -0,0 +1,59 @@
+import threading
+from fritzbox_link_saturation import count_bytes, count_new_samples, get_interval, integrate_bytes
+
+SERIES = [100, 200, 300, 400, 500]
+
+def test_count_new_samples_first_run():
+  assert count_new_samples(1000.0, None, 5) == (None, 1000.0)
+
+def test_count_new_samples_advances_in_whole_intervals():
+  assert count_new_samples(1300.0, 1000.0, 5) == (60, 1300.0)
+  # a run starting a little late or early counts the same samples
+  assert count_new_samples(1302.0, 1000.0, 5) == (60, 1300.0)
+  assert count_new_samples(1298.0, 1000.0, 5) == (60, 1300.0)
+
+def test_count_new_samples_counts_a_sample_once():
+  count, cursor = count_new_samples(1002.4, 1000.0, 5)
+  assert (count, cursor) == (0, 1000.0)
+  count, cursor = count_new_samples(1004.0, cursor, 5)
+  assert (count, cursor) == (1, 1005.0)
+
+def test_count_new_samples_cursor_ahead_of_the_clock():
+  # an early run rounded the cursor up, the next one follows right after
+  count, cursor = count_new_samples(1298.0, 1000.0, 5)
+  assert count_new_samples(1299.0, cursor, 5) == (0, 1300.0)
+  assert count_new_samples(1296.0, cursor, 5) == (0, 1300.0)
+
+def test_count_new_samples_clock_went_back():
+  assert count_new_samples(900.0, 1000.0, 5) == (None, 900.0)
+
+def test_integrate_bytes_whole_series():
+  assert integrate_bytes(SERIES, None, 5) == 1500 * 5
+
+def test_integrate_bytes_new_samples_only():
+  assert integrate_bytes(SERIES, 2, 5) == (400 + 500) * 5
+  assert integrate_bytes(SERIES, 0, 5) == 0
+
+def test_integrate_bytes_estimates_samples_beyond_the_series():
+  # 5 samples in the series, 3 more taken before it reaches back
+  assert integrate_bytes(SERIES, 8, 5) == 1500 * 5 + 3 * 5 * 300
+
+def test_integrate_bytes_empty_series():
+  assert integrate_bytes([], 3, 5) == 0
+  assert integrate_bytes([], None, 5) == 0
+
+def test_get_interval():
+  assert get_interval({'sampling_interval': 2000}) == 2
+  assert get_interval({}) == 5
+
+def test_count_bytes_concurrent_runs(config):
+  jsondata = {data: SERIES for data in ['us_realtime_bps_curr', 'us_important_bps_curr', 'us_default_bps_curr',
+    'us_background_bps_curr', 'ds_bps_curr', 'ds_mc_bps_curr']}
+  count_bytes(jsondata, 5, 1000.0, config)
+  # runs at the same time share the new sample, only one of them counts it
+  threads = [threading.Thread(target=count_bytes, args=(jsondata, 5, 1005.0, config)) for i in range(10)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert count_bytes(jsondata, 5, 1005.0, config)['dn_internet'] == 1500 * 5 + 500 * 5